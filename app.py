@@ -1,7 +1,31 @@
+import os
+import time
+
 import streamlit as st
-import x_api  
-from llm_utils import generate_reply  
-from test1 import get_recent_tweets
+
+import metrics
+from jobs import JobQueue
+
+# Every fetch, LLM call and post runs in the worker process (python worker.py);
+# this page only submits jobs to the shared queue and polls their results.
+POLL_INTERVAL = 60
+METRICS_URL = os.getenv("METRICS_URL", "http://127.0.0.1:9108")
+
+
+@st.cache_resource
+def get_job_queue():
+    return JobQueue("jobs.db")
+
+
+def job(name):
+    """Latest state of this session's job of the given kind, or None"""
+    job_id = st.session_state.jobs.get(name)
+    return get_job_queue().get(job_id) if job_id else None
+
+
+def submit(name, payload):
+    st.session_state.jobs[name] = get_job_queue().submit(name, payload)
+
 
 if "tweets" not in st.session_state:
     st.session_state.tweets = []
@@ -9,20 +33,33 @@ if "monitoring" not in st.session_state:
     st.session_state.monitoring = False
 if "replies" not in st.session_state:
     st.session_state.replies = {}
+if "jobs" not in st.session_state:
+    st.session_state.jobs = {}
+if "since_ids" not in st.session_state:
+    st.session_state.since_ids = {}
+if "last_poll" not in st.session_state:
+    st.session_state.last_poll = 0.0
+if "poll_seen" not in st.session_state:
+    st.session_state.poll_seen = None
+if "expired" not in st.session_state:
+    st.session_state.expired = set()
 
 st.title("_X_ :green[Mention Tracker] + :blue[Auto Responder]")
 
-query = st.text_input("Enter keyword or @handle to monitor:")
+query = st.text_area("Keywords and @handles to monitor (one per line or comma separated):")
+watches = [entry.strip() for line in query.splitlines() for entry in line.split(",") if entry.strip()]
 reply_style = st.selectbox("Choose reply style", ["Friendly", "Professional", "Funny"])
-max_length = st.slider("Select number of tweets to fetch", 10, 99, 20)
+max_length = st.slider("Select number of tweets to fetch", 10, 1000, 20)
+reply_mode = st.radio("Reply generation", ["Stream", "Batch"], horizontal=True,
+                      help="Stream shows each reply as it is written; Batch answers several tweets per LLM request")
 
 st.markdown("---")
 
 if st.button("Start Monitoring"):
-    if query:
-        # st.session_state.tweets = x_api.get_recent_tweets(query, max_length)
-        st.session_state.tweets = get_recent_tweets(query, max_length)
+    if watches:
+        st.session_state.watches = watches
         st.session_state.monitoring = True
+        st.session_state.last_poll = 0.0
         st.success("Monitoring started.")
     else:
         st.warning("Please enter a keyword or handle.")
@@ -32,53 +69,166 @@ if st.button("Stop Monitoring"):
     st.info("Monitoring stopped. Tweets will remain displayed.")
 
 if st.button("Generate Replies"):
+    pending = [tweet for tweet in st.session_state.tweets
+               if str(tweet["id"]) not in st.session_state.replies
+               and str(tweet["id"]) not in st.session_state.expired]
     if not st.session_state.tweets:
         st.warning("No tweets to reply to. Start monitoring first.")
-    else:
-        with st.spinner("Generating replies..."):
-            for tweet in st.session_state.tweets:
-                if tweet["id"] not in st.session_state.replies:
-                    reply = generate_reply(tweet["content"], reply_style)
-                    st.session_state.replies[tweet["id"]] = reply
-        st.success("Replies generated!")
+    elif pending:
+        st.session_state.generate_total = len(pending)
+        submit("generate", {"tweets": pending, "style": reply_style, "mode": reply_mode})
 
 # Post Replies 
 if st.button("Send Replies to Tweets"):
-    import os
-    import tweepy
-    from dotenv import load_dotenv
-    load_dotenv()
-
-    client = tweepy.Client(
-        bearer_token=os.getenv("BEARER_TOKEN"),
-        consumer_key=os.getenv("CONSUMER_KEY"),
-        consumer_secret=os.getenv("CONSUMER_SECRET"),
-        access_token=os.getenv("ACCESS_TOKEN"),
-        access_token_secret=os.getenv("ACCESS_TOKEN_SECRET")
-    )
-
-    with st.spinner("Posting replies to tweets..."):
+    replies = {str(tweet["id"]): st.session_state.replies[str(tweet["id"])]
+               for tweet in st.session_state.tweets if str(tweet["id"]) in st.session_state.replies}
+    if replies:
+        submit("post", {"replies": replies})
+
+
+@st.fragment(run_every=1)
+def live_view():
+    """Reruns every second on its own, picking up job results without blocking the rest of the page"""
+    poll = job("poll")
+    if poll and poll["status"] == "done" and st.session_state.poll_seen != poll["id"]:
+        st.session_state.poll_seen = poll["id"]
+        st.session_state.since_ids.update(poll["result"]["since_ids"])
+        # Overlapping polls (retried jobs, reruns) can deliver a tweet twice; keep the first copy
+        seen = {str(tweet["id"]) for tweet in st.session_state.tweets}
+        new = []
+        for tweet in poll["result"]["tweets"]:
+            if str(tweet["id"]) not in seen:
+                seen.add(str(tweet["id"]))
+                new.append(tweet)
+        st.session_state.tweets = new + st.session_state.tweets
+    elif poll and poll["status"] == "failed":
+        st.error(f"Fetching tweets failed: {poll['error']}")
+
+    # Queue the next fetch once the previous one is finished and the interval has passed
+    if (st.session_state.monitoring and (not poll or poll["status"] in ("done", "failed"))
+            and time.time() - st.session_state.last_poll >= POLL_INTERVAL):
+        st.session_state.last_poll = time.time()
+        submit("poll", {"watches": st.session_state.watches, "max_results": max_length,
+                        "since_ids": st.session_state.since_ids})
+        poll = job("poll")
+    if st.session_state.monitoring:
+        fetching = poll and poll["status"] in ("queued", "running")
+        st.caption(f"Monitoring {len(st.session_state.watches)} watches" + (" · fetching..." if fetching else ""))
+
+    generating = job("generate")
+    partial, skipped, rejected, deferred = {}, set(), set(), set()
+    if generating:
+        result = generating["result"] or {}
+        st.session_state.replies.update({tweet_id: reply for tweet_id, reply in result.get("replies", {}).items()
+                                         if reply is not None})
+        partial = result.get("partial", {})
+        skipped = {str(tweet_id) for tweet_id in result.get("skipped", [])}
+        rejected = {str(tweet_id) for tweet_id in result.get("rejected", [])}
+        deferred = {str(tweet_id) for tweet_id in result.get("deferred", [])}
+        st.session_state.expired.update(str(tweet_id) for tweet_id in result.get("expired", []))
+        if generating["status"] in ("queued", "running"):
+            total = st.session_state.generate_total
+            done = (len(result.get("replies", {})) + len(skipped) + len(rejected) + len(deferred)
+                    + len(result.get("expired", [])))
+            st.progress(done / total if total else 0.0, text=f"Generated {done}/{total} replies")
+        elif generating["status"] == "failed":
+            st.error(f"Generating replies failed: {generating['error']}")
+        else:
+            st.success("Replies generated!")
+            if deferred:
+                st.warning(f"{len(deferred)} tweets deferred: this hour's LLM token quota is used up. "
+                           "Generate again later to answer them.")
+
+    posting = job("post")
+    if posting:
+        if posting["status"] in ("queued", "running"):
+            st.info("Posting replies to tweets...")
+        elif posting["status"] == "failed":
+            st.error(f"Posting replies failed: {posting['error']}")
+        else:
+            report = posting["result"]
+            for result in report["results"]:
+                if result["status"] == "failed":
+                    st.error(f"Failed to reply to tweet {result['tweet_id']}: {result['error']}")
+            st.success(f"Replies posted! {report['posted']} sent, {report['skipped']} already posted, "
+                       f"{report['failed']} failed ({report['posts_per_sec']:.1f}/s)")
+            if report.get("unconfirmed"):
+                st.warning(f"{report['unconfirmed']} replies may not have gone through; they will be checked "
+                           "before the next send and retried if missing.")
+            if report.get("deferred"):
+                st.warning(f"{len(report['deferred'])} replies held back by the hourly post quota; "
+                           "send again later.")
+            if report.get("expired"):
+                st.caption(f"{len(report['expired'])} replies dropped: their tweets are too old to answer now.")
+
+    st.markdown("---")
+    if st.session_state.tweets:
+        st.subheader("Recent Tweets")
         for tweet in st.session_state.tweets:
-            tweet_id = tweet["id"]
-            if tweet_id in st.session_state.replies:
-                try:
-                    client.create_tweet(
-                        text=st.session_state.replies[tweet_id],
-                        in_reply_to_tweet_id=tweet_id
-                    )
-                except Exception as e:
-                    st.error(f"Failed to reply to tweet {tweet_id}: {e}")
-        st.success("Replies posted!")
+            tweet_id = str(tweet["id"])
+            with st.container():
+                st.markdown(f"**User:** @{tweet['username']} | *{tweet['created_at']}*"
+                            + (f" | matched {', '.join(tweet['watches'])}" if tweet.get("watches") else ""))
+                st.markdown(f"**Tweet:** {tweet['content']}"
+                            + (f" *(+{tweet['cluster_size'] - 1} near-duplicates)*"
+                               if tweet.get("cluster_size", 1) > 1 else ""))
+                st.markdown(f"[🔗 View Tweet]({tweet['url']})")
 
-st.markdown("---")
-if st.session_state.tweets:
-    st.subheader("Recent Tweets")
-    for tweet in st.session_state.tweets:
-        with st.container():
-            st.markdown(f"**User:** @{tweet['username']} | *{tweet['created_at']}*")
-            st.markdown(f"**Tweet:** {tweet['content']}")
-            st.markdown(f"[🔗 View Tweet]({tweet['url']})")
-
-            if tweet["id"] in st.session_state.replies:
-                st.success(f"💬 AI Reply: {st.session_state.replies[tweet['id']]}")
-            st.markdown("---")
+                if tweet_id in st.session_state.replies:
+                    st.success(f"💬 AI Reply: {st.session_state.replies[tweet_id]}")
+                elif tweet_id in partial:
+                    st.info(f"💬 {partial[tweet_id]}▌")
+                elif tweet_id in skipped:
+                    st.caption("Skipped: part of a wave of near-identical tweets")
+                elif tweet_id in rejected:
+                    st.caption("Skipped: the local classifier scored it as not worth a reply")
+                elif tweet_id in deferred:
+                    st.caption("Deferred: waiting for LLM budget")
+                elif tweet_id in st.session_state.expired:
+                    st.caption("Expired: waited too long for a reply")
+                st.markdown("---")
+
+
+live_view()
+
+
+@st.fragment(run_every=5)
+def diagnostics():
+    """Worker stage timings and counters, read from its /metrics.json"""
+    with st.expander("Diagnostics"):
+        st.caption("Jobs: " + ", ".join(f"{count} {status}" for status, count in get_job_queue().counts().items()))
+        snapshot = metrics.fetch_snapshot(METRICS_URL)
+        if snapshot is None:
+            st.info(f"Worker metrics not reachable at {METRICS_URL}")
+            return
+
+        def rows(name, label):
+            return [{label: series["labels"].get(label, ""), "calls": series["count"],
+                     "mean ms": round(series["mean"] * 1000, 3), "p50 ms ≤": series["p50"] * 1000,
+                     "p99 ms ≤": series["p99"] * 1000}
+                    for series in snapshot["histograms"].get(name, []) if series["count"]]
+
+        def counter(name, **labels):
+            return sum(series["value"] for series in snapshot["counters"].get(name, [])
+                       if all(series["labels"].get(k) == v for k, v in labels.items()))
+
+        st.markdown("**Stages**")
+        st.dataframe(rows("stage_seconds", "stage"), hide_index=True)
+        st.markdown("**X API calls**")
+        st.dataframe(rows("x_api_request_seconds", "endpoint"), hide_index=True)
+
+        hits, misses = counter("reply_cache_requests_total", result="hit"), counter("reply_cache_requests_total",
+                                                                                    result="miss")
+        cols = st.columns(4)
+        cols[0].metric("Rate-limit hits", int(counter("rate_limit_hits_total")))
+        cols[1].metric("Reply cache hit rate", f"{hits / (hits + misses):.0%}" if hits + misses else "–")
+        cols[2].metric("LLM tokens in / out", f"{int(counter('llm_tokens_total', kind='input')):,} / "
+                                               f"{int(counter('llm_tokens_total', kind='output')):,}")
+        cols[3].metric("Tweets fetched", int(counter("tweets_fetched_total")))
+        drops = {series["labels"]["reason"]: int(series["value"])
+                 for series in snapshot["counters"].get("filter_drops_total", [])}
+        if drops:
+            st.markdown("**Filter drops:** " + ", ".join(f"{reason} {count}" for reason, count in drops.items()))
+
+
+diagnostics()
@@ -0,0 +1,129 @@
+import numpy as np
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+from test1 import HumanTweetFilter
+
+
+class BatchTweetScorer:
+    """Column-oriented version of HumanTweetFilter.filter_for_replies.
+
+    Features are gathered into NumPy arrays once per batch and the weights
+    from calculate_human_score are applied with vector arithmetic. Checks
+    run in the same order as the per-tweet path, and each stage only looks
+    at rows that survived the previous one, so decisions and scores match
+    filter_for_replies exactly.
+    """
+
+    def __init__(self, tweet_filter: Optional[HumanTweetFilter] = None):
+        self.tweet_filter = tweet_filter or HumanTweetFilter()
+
+    def _column(self, values: Iterable[int]) -> np.ndarray:
+        return np.fromiter(values, dtype=np.int64)
+
+    def features(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Compute the per-tweet feature columns; rows dropped early keep zeros"""
+        f = self.tweet_filter
+        n = len(texts)
+        lowered = [text.lower() for text in texts]
+        hits = [f._matcher.count(text) for text in lowered]
+
+        cols = {
+            'promotional_hits': self._column(h['promotional'] for h in hits),
+            'human_hits': self._column(h['human'] for h in hits),
+            'reply_worthy_hits': self._column(h['reply_worthy'] for h in hits),
+            'casual_hits': self._column(h['casual'] for h in hits),
+            'length': self._column(len(text) for text in texts),
+            'question_marks': self._column(text.count('?') for text in lowered),
+        }
+
+        # Promotional: keyword hits first, regexes only where still undecided
+        promotional = cols['promotional_hits'] >= 2
+        rows = np.flatnonzero(~promotional).tolist()
+        promotional[rows] = [
+            bool(f._promo_regex.search(lowered[i])
+                 or len(f._hashtag_regex.findall(lowered[i])) > 4
+                 or len(f._emoji_regex.findall(lowered[i])) > 6
+                 or len(f._caps_regex.findall(texts[i])) > 2)
+            for i in rows
+        ]
+        cols['promotional'] = promotional
+
+        bot = np.zeros(n, dtype=bool)
+        rows = np.flatnonzero(~promotional).tolist()
+        bot[rows] = [f.is_bot_content(None, {'stripped': lowered[i].strip()}) for i in rows]
+        cols['bot'] = bot
+
+        genuine = np.zeros(n, dtype=np.int64)
+        contractions = np.zeros(n, dtype=np.int64)
+        pronouns = np.zeros(n, dtype=np.int64)
+        rows = np.flatnonzero(~(promotional | bot)).tolist()
+        genuine[rows] = [sum(1 for regex in f._genuine_regexes if regex.search(lowered[i])) for i in rows]
+        contractions[rows] = [len(f._contraction_regex.findall(lowered[i])) for i in rows]
+        pronouns[rows] = [len(f._pronoun_regex.findall(lowered[i])) for i in rows]
+        cols['genuine_hits'] = genuine
+        cols['contractions'] = contractions
+        cols['pronouns'] = pronouns
+        return cols
+
+    def score(self, cols: Dict[str, np.ndarray]) -> np.ndarray:
+        """Vectorized calculate_human_score, same operation order as the scalar path"""
+        score = 0.3 + cols['human_hits'] * 0.1
+        score = score + cols['genuine_hits'] * 0.15
+        score = score + np.minimum(cols['contractions'] * 0.1, 0.2)
+        score = score + np.minimum(cols['question_marks'] * 0.05, 0.15)
+        score = score + np.minimum(cols['casual_hits'] * 0.08, 0.2)
+        score = score + np.minimum(cols['pronouns'] * 0.05, 0.15)
+        length = cols['length']
+        score = score + np.where((length >= 20) & (length <= 200), 0.1,
+                                 np.where((length > 200) & (length <= 280), 0.05, 0.0))
+        return np.minimum(score, 1.0)
+
+    def top_k(self, texts: List[str], k: Optional[int] = None,
+              min_human_score: float = 0.3) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (indices, scores) of kept tweets, best first
+
+        Ordering matches the stable sort in filter_for_replies: by score
+        rounded to two decimals, ties in input order. With k set, only the
+        best k are selected via argpartition instead of sorting everything.
+        """
+        # Identical texts (retweets, copypasta, spam waves) share one feature row
+        uniques: Dict[str, int] = {}
+        inverse = np.fromiter((uniques.setdefault(text, len(uniques)) for text in texts),
+                              dtype=np.int64, count=len(texts))
+        cols = {name: col[inverse] for name, col in self.features(list(uniques)).items()}
+        scores = self.score(cols)
+        # Questions are always reply-worthy, otherwise any reply-worthy indicator
+        reply_worthy = (cols['question_marks'] > 0) | (cols['reply_worthy_hits'] >= 1)
+        keep = ~cols['promotional'] & ~cols['bot'] & reply_worthy & (scores >= min_human_score)
+
+        kept = np.flatnonzero(keep)
+        # Scores are sums of multiples of 0.01, so this equals round(score, 2) * 100
+        keys = np.rint(scores[kept] * 100).astype(np.int64)
+
+        if k is not None and k < len(kept):
+            if k <= 0:
+                return kept[:0], scores[kept[:0]]
+            threshold = keys[np.argpartition(-keys, k - 1)[:k]].min()
+            above = np.flatnonzero(keys > threshold)
+            ties = np.flatnonzero(keys == threshold)[:k - len(above)]
+            chosen = np.concatenate([above, ties])
+        else:
+            chosen = np.arange(len(kept))
+
+        order = chosen[np.lexsort((chosen, -keys[chosen]))]
+        indices = kept[order]
+        return indices, scores[indices]
+
+    def filter_for_replies(self, tweets: List[Dict[str, Any]], min_human_score: float = 0.3,
+                           k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Batch equivalent of HumanTweetFilter.filter_for_replies, optionally capped at top k"""
+        indices, scores = self.top_k([tweet['content'] for tweet in tweets], k, min_human_score)
+
+        filtered_tweets = []
+        for i, score in zip(indices.tolist(), scores.tolist()):
+            tweet = tweets[i]
+            tweet['human_score'] = round(score, 2)
+            tweet['reply_worthy'] = True
+            filtered_tweets.append(tweet)
+        return filtered_tweets
@@ -0,0 +1,776 @@
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List, Dict, Any, Callable, Tuple
+
+from test1 import HumanTweetFilter
+from batch_filter import BatchTweetScorer
+from fakes import FakeLLM, StubXServer
+
+# Building blocks for synthetic tweets, one list per kind of content
+PROMOTIONAL = [
+    "FLASH SALE today only!! 50% off all hardware wallets, use code SAVE50 #crypto #btc #wallet #deal #sale",
+    "Limited time offer: free shipping on every order, link in bio",
+    "Giveaway time! follow and retweet to win a Ledger, tag friends to enter",
+    "Check out our new collab with a brand partner, shop now before it's gone",
+    "Save $20 on the Tangem 3-pack this week only, order now",
+]
+BOT = [
+    "gm", "good morning!", "thanks for the follow", "1/3", "wow!!", "yes",
+    "@cryptodaily @walletnews", "https://t.co/abc123 https://t.co/def456",
+    "moon moon moon moon moon",
+]
+HUMAN = [
+    "honestly been using my cold wallet for a year now and it's been fine tbh",
+    "I noticed the new firmware update changed the pin screen, kinda confusing",
+    "we tried moving everything to a multisig setup last weekend, took forever lol",
+    "not sure why everyone hates on software wallets, mine's been solid",
+    "just tried the recovery flow on my backup device and it actually worked",
+]
+QUESTION = [
+    "has anyone had trouble restoring a seed phrase on the new Ledger app?",
+    "which should I get, Tangem or Coldcard? thoughts?",
+    "does anyone know why my wallet isn't syncing since yesterday??",
+    "I'm wondering if it's worth switching to cypherock, anyone recommend it?",
+    "how do I export my xpub without connecting to a laptop?",
+]
+FILLER = ["ngl", "idk", "lately", "again", "today", "btw", "for real", "i think", "maybe"]
+# Labeled keep/skip examples for the classifier benchmark. The keep side includes
+# tweets where substring keywords misfire ("ad" in "already", "win" in "windows");
+# the skip side includes engagement bait and hype that still looks reply-worthy.
+KEEP = QUESTION + HUMAN + [
+    "already tried reinstalling and the app still crashes on my windows laptop, any fix?",
+    "just read the passphrase docs again and i'm still not sure what it actually protects against",
+    "been reading about multisig all week, is it overkill for a small stack?",
+    "my head hurts from trying to get the bluetooth pairing working, is there a trick?",
+    "ready to move off the exchange but kinda nervous about losing the seed, how do you store yours?",
+]
+SKIP = [
+    "what's your favorite wallet? reply below and we'll pick one lucky follower 👀",
+    "who's ready for the next bull run?? 🚀🚀🚀",
+    "why is nobody talking about this coin?? 100x incoming",
+    "thoughts? our new app update is live now, you're going to love it",
+    "how do i get rich quick? asking for a friend lol",
+    "which would you pick, lambo or moon? wrong answers only",
+]
+
+
+def make_corpus(n: int, seed: int = 42, mix: Dict[str, float] = None,
+                duplicate_rate: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    Generate n seeded synthetic tweets mixing promotional, bot, human and question content
+
+    Args:
+        n: Number of tweets
+        seed: Random seed, the same seed always yields the same corpus
+        mix: Relative weight of each kind of tweet
+        duplicate_rate: Fraction of tweets that repeat an earlier tweet's text (retweets, copypasta)
+    """
+    rng = random.Random(seed)
+    mix = mix or {"promotional": 0.25, "bot": 0.15, "human": 0.35, "question": 0.25}
+    pools = {"promotional": PROMOTIONAL, "bot": BOT, "human": HUMAN, "question": QUESTION}
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+
+    tweets = []
+    for i in range(n):
+        if tweets and rng.random() < duplicate_rate:
+            original = rng.choice(tweets)
+            kind, text = original["kind"], original["content"]
+        else:
+            kind = rng.choices(kinds, weights)[0]
+            text = rng.choice(pools[kind])
+            if kind != "bot":
+                # Perturb the template so most tweets are distinct strings
+                words = text.split()
+                for _ in range(rng.randint(1, 3)):
+                    words.insert(rng.randrange(len(words) + 1), rng.choice(FILLER))
+                words.append(f"#{rng.randrange(10**6)}" if kind == "promotional" else str(rng.randrange(10**6)))
+                text = " ".join(words)
+        tweets.append({
+            "id": 10**18 + i,
+            "created_at": "2024-01-01 00:00:00",
+            "username": f"user{rng.randrange(5000)}",
+            "content": text,
+            "kind": kind,
+            "url": f"https://twitter.com/user/status/{10**18 + i}",
+        })
+    return tweets
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """q-th percentile (0-100) of the samples, nearest-rank"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def peak_memory(fn: Callable, *args) -> float:
+    """Peak Python heap growth in KiB while running fn(*args)"""
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_filter_methods(n: int = 20_000, seed: int = 42) -> Dict[str, Dict[str, float]]:
+    """Per-call latency, throughput and peak memory of each HumanTweetFilter check"""
+    tweets = make_corpus(n, seed)
+    tweet_filter = HumanTweetFilter()
+    methods = {
+        "is_promotional": tweet_filter.is_promotional,
+        "is_bot_content": tweet_filter.is_bot_content,
+        "calculate_human_score": tweet_filter.calculate_human_score,
+        "is_reply_worthy": tweet_filter.is_reply_worthy,
+    }
+
+    results = {}
+    for name, method in methods.items():
+        samples = []
+        clock = time.perf_counter
+        start = clock()
+        for tweet in tweets:
+            t0 = clock()
+            method(tweet)
+            samples.append(clock() - t0)
+        elapsed = clock() - start
+        results[f"filter.{name}"] = {
+            "tweets_per_sec": n / elapsed,
+            "p50_us": percentile(samples, 50) * 1e6,
+            "p99_us": percentile(samples, 99) * 1e6,
+            "peak_kib": peak_memory(lambda: [method(tweet) for tweet in tweets]),
+        }
+
+    start = time.perf_counter()
+    tweet_filter.filter_for_replies(copy.deepcopy(tweets))
+    elapsed = time.perf_counter() - start
+    results["filter.filter_for_replies"] = {
+        "tweets_per_sec": n / elapsed,
+        "peak_kib": peak_memory(lambda: tweet_filter.filter_for_replies(copy.deepcopy(tweets))),
+    }
+    return results
+
+
+def bench_pipeline(n: int = 500, x_latency: float = 0.01, llm_latency: float = 0.2, concurrency: int = 8,
+                   handles: int = 20, seed: int = 42) -> Dict[str, Dict[str, float]]:
+    """
+    End-to-end fetch -> filter -> reply -> post run against fakes
+
+    Tweets are served by a FakeXClient spread over `handles` timelines,
+    replies come from a FakeLLM and are posted to a local StubXServer, all
+    through the same monitor, filter, generate_replies and ReplyPoster code
+    the app uses.
+    """
+    from fakes import FakeXClient
+    from llm_utils import TokenAccounting, generate_replies
+    from monitor import TweetMonitor
+    from poster import PostLedger, ReplyPoster
+    from x_clients import make_client
+
+    reader = FakeXClient(latency=x_latency)
+    for i, tweet in enumerate(make_corpus(n, seed, duplicate_rate=0)):
+        reader.post(f"handle{i % handles}", tweet["content"])
+    fake = FakeLLM(latency=llm_latency)
+    accounting = TokenAccounting()
+
+    def run(server, ledger_path):
+        stages = {}
+        start = time.perf_counter()
+        monitor = TweetMonitor([f"@handle{i}" for i in range(handles)], max_results=n, client=reader,
+                               state_path=None)
+        monitor.poll_once()
+        tweets = monitor.drain()
+        stages["fetch_s"] = time.perf_counter() - start
+
+        t0 = time.perf_counter()
+        kept = HumanTweetFilter().filter_for_replies(tweets)
+        stages["filter_s"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        ready = {}
+
+        async def collect():
+            async for tweet_id, reply in generate_replies(kept, concurrency=concurrency, llm_client=fake,
+                                                          accounting=accounting):
+                ready[tweet_id] = (reply, time.perf_counter() - t0)
+
+        asyncio.run(collect())
+        stages["generate_s"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        writer = make_client(base_url=server.url, bearer_token="stub", consumer_key="stub",
+                             consumer_secret="stub", access_token="stub", access_token_secret="stub")
+        poster = ReplyPoster(client=writer, ledger=PostLedger(ledger_path), workers=concurrency, backoff=0)
+        report = poster.post_all({tweet_id: reply for tweet_id, (reply, _) in ready.items() if reply})
+        poster.ledger.close()
+        stages["post_s"] = time.perf_counter() - t0
+        stages["total_s"] = time.perf_counter() - start
+        return tweets, ready, report, stages
+
+    with tempfile.TemporaryDirectory() as tmp, StubXServer(rate_limit=10 ** 6) as server:
+        tracemalloc.start()
+        tweets, ready, report, stages = run(server, os.path.join(tmp, "ledger.db"))
+        peak = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+
+    reply_latency = [call["latency"] for call in accounting.calls]
+    ready_at = [at for _, at in ready.values()]
+    post_latency = [result["seconds"] for result in report["results"]]
+    return {"pipeline": {
+        "tweets": len(tweets),
+        "replies": report["posted"],
+        "tweets_per_sec": len(tweets) / stages["total_s"],
+        "replies_per_sec": report["posted"] / stages["total_s"],
+        **stages,
+        "llm_p50_ms": percentile(reply_latency, 50) * 1000,
+        "llm_p99_ms": percentile(reply_latency, 99) * 1000,
+        "reply_ready_p50_ms": percentile(ready_at, 50) * 1000,
+        "reply_ready_p99_ms": percentile(ready_at, 99) * 1000,
+        "post_p50_ms": percentile(post_latency, 50) * 1000,
+        "post_p99_ms": percentile(post_latency, 99) * 1000,
+        "peak_kib": peak,
+    }}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float = 0.1) -> List[str]:
+    """
+    Regressions of `results` against `baseline`
+
+    Metrics ending in _per_sec are better when higher, everything else
+    (latencies, seconds, memory) when lower; counts are not compared. A
+    metric regresses when it is worse than the baseline by more than
+    `tolerance` (a fraction).
+    """
+    regressions = []
+    for bench, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(bench, {}).get(metric)
+            if not old or metric in ("tweets", "replies"):
+                continue
+            change = (value - old) / old
+            worse = -change if metric.endswith("_per_sec") else change
+            if worse > tolerance:
+                regressions.append(f"{bench}.{metric}: {old:,.2f} -> {value:,.2f} ({change:+.0%})")
+    return regressions
+
+
+def bench_suite(n: int = 20_000, pipeline_tweets: int = 500, llm_latency: float = 0.2, x_latency: float = 0.01,
+                save: str = None, baseline: str = None, tolerance: float = 0.1) -> int:
+    """Run the filter micro-benchmarks and the end-to-end pipeline; returns 1 on a regression"""
+    results = bench_filter_methods(n)
+    results.update(bench_pipeline(pipeline_tweets, x_latency, llm_latency))
+
+    for bench, metrics in results.items():
+        print(bench)
+        for metric, value in metrics.items():
+            print(f"  {metric:20} {value:14,.2f}")
+
+    params = {"tweets": n, "pipeline_tweets": pipeline_tweets, "llm_latency": llm_latency, "x_latency": x_latency}
+    if save:
+        with open(save, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.strftime("%Y-%m-%d %H:%M:%S"), "python": sys.version.split()[0],
+                       "params": params, "results": results}, f, indent=2)
+        print(f"Saved results to {save}")
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("params") != params:
+            print(f"Note: {baseline} was run with different parameters: {saved.get('params')}")
+        regressions = compare(results, saved["results"], tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions against {baseline} (tolerance {tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions against {baseline} (tolerance {tolerance:.0%})")
+    return 0
+
+
+def bench_batch(n: int, k: int = None, seed: int = 42, duplicate_rate: float = 0.1):
+    """Compare per-tweet filter_for_replies against BatchTweetScorer on the same corpus"""
+    tweets = make_corpus(n, seed, duplicate_rate=duplicate_rate)
+    tweet_filter = HumanTweetFilter()
+    scorer = BatchTweetScorer(tweet_filter)
+
+    per_tweet_input = copy.deepcopy(tweets)
+    start = time.perf_counter()
+    expected = tweet_filter.filter_for_replies(per_tweet_input)
+    if k is not None:
+        expected = expected[:k]
+    per_tweet_time = time.perf_counter() - start
+
+    batch_input = copy.deepcopy(tweets)
+    start = time.perf_counter()
+    result = scorer.filter_for_replies(batch_input, k=k)
+    batch_time = time.perf_counter() - start
+
+    same = ([(t["id"], t["human_score"]) for t in expected] ==
+            [(t["id"], t["human_score"]) for t in result])
+    unique = len({t["content"] for t in tweets})
+    print(f"tweets: {n}  unique texts: {unique}  kept: {len(result)}  identical: {same}")
+    print(f"per-tweet: {per_tweet_time:.3f}s ({n / per_tweet_time:,.0f} tweets/s)")
+    print(f"batch:     {batch_time:.3f}s ({n / batch_time:,.0f} tweets/s)")
+    print(f"speedup:   {per_tweet_time / batch_time:.2f}x")
+
+
+def bench_replies(n: int, latency: float = 0.2, concurrency: int = 10):
+    """Compare the serial generate_reply loop against generate_replies on a fake LLM"""
+    from llm_utils import generate_reply, generate_replies
+
+    tweets = make_corpus(n, duplicate_rate=0)
+    fake = FakeLLM(latency=latency)
+
+    start = time.perf_counter()
+    for tweet in tweets:
+        generate_reply(tweet["content"], llm_client=fake)
+    serial_time = time.perf_counter() - start
+
+    async def collect():
+        first = None
+        async for _ in generate_replies(tweets, concurrency=concurrency, llm_client=fake):
+            first = first or time.perf_counter() - start
+        return first
+
+    start = time.perf_counter()
+    first_reply = asyncio.run(collect())
+    concurrent_time = time.perf_counter() - start
+
+    print(f"replies: {n}  latency: {latency:.2f}s  concurrency: {concurrency}")
+    print(f"serial:     {serial_time:.2f}s")
+    print(f"concurrent: {concurrent_time:.2f}s (first reply after {first_reply:.2f}s)")
+    print(f"speedup:    {serial_time / concurrent_time:.2f}x")
+
+
+def bench_prompt(n: int, per_token_latency: float = 0.0005, min_cache_tokens: int = 0):
+    """Compare the old single flat prompt against the cached system message + per-tweet user message"""
+    from llm_utils import PERSONA, GUIDELINES, CLOSING, TokenAccounting, generate_reply
+
+    tweets = make_corpus(n, duplicate_rate=0)
+
+    def legacy_prompt(text, style="Friendly"):
+        # The tweet sat between the persona and the guidelines, so nothing after it could be cached
+        return (f'{PERSONA}\n\nTweet you\'re replying to:\n"{text}"\n\n'
+                f'{GUIDELINES.format(style=style.lower())}\n{CLOSING}')
+
+    fake = FakeLLM(latency=0, per_token_latency=per_token_latency, min_cache_tokens=min_cache_tokens)
+    legacy = TokenAccounting()
+    for tweet in tweets:
+        start = time.perf_counter()
+        message = fake.invoke(legacy_prompt(tweet["content"]))
+        legacy.record(message, time.perf_counter() - start)
+
+    fake = FakeLLM(latency=0, per_token_latency=per_token_latency, min_cache_tokens=min_cache_tokens)
+    split = TokenAccounting()
+    for tweet in tweets:
+        generate_reply(tweet["content"], llm_client=fake, accounting=split)
+
+    print(f"replies: {n}  per-token latency: {per_token_latency * 1000:.2f} ms  min cached prefix: {min_cache_tokens}")
+    for name, report in (("flat prompt", legacy.report()), ("split prompt", split.report())):
+        print(f"{name + ':':14}{report['input_tokens'] / n:,.0f} input tokens/reply, "
+              f"{report['uncached_tokens_per_reply']:,.0f} uncached, "
+              f"{report['latency_per_reply'] * 1000:.1f} ms/reply")
+    saved = legacy.report()["uncached_tokens_per_reply"] - split.report()["uncached_tokens_per_reply"]
+    print(f"saved:        {saved:,.0f} uncached input tokens per reply")
+
+
+def bench_batched(n: int, latency: float = 0.5, concurrency: int = 2, batch_drop: float = 0.0):
+    """Compare one request per tweet against multi-tweet batch requests on a fake LLM"""
+    from llm_utils import BatchSizer, TokenAccounting, generate_replies, generate_replies_batched
+
+    tweets = make_corpus(n, duplicate_rate=0)
+
+    def run(generate, **kwargs):
+        fake = FakeLLM(latency=latency, per_token_latency=0.0002, per_output_token_latency=0.01,
+                       min_cache_tokens=1024, batch_drop=batch_drop)
+        accounting = TokenAccounting()
+
+        async def collect():
+            return [reply async for _, reply in generate(tweets, concurrency=concurrency, llm_client=fake,
+                                                         accounting=accounting, **kwargs)]
+
+        start = time.perf_counter()
+        replies = asyncio.run(collect())
+        elapsed = time.perf_counter() - start
+        report = accounting.report()
+        return elapsed, fake.calls, report["input_tokens"], sum(reply is not None for reply in replies)
+
+    sizer = BatchSizer()
+    rows = [("per tweet", run(generate_replies)), ("batched", run(generate_replies_batched, sizer=sizer))]
+
+    print(f"replies: {n}  latency: {latency:.2f}s/call  concurrency: {concurrency}  batch drop: {batch_drop:.0%}")
+    for name, (elapsed, calls, input_tokens, done) in rows:
+        print(f"{name + ':':11}{elapsed:6.2f}s  {calls:4d} LLM calls  {input_tokens / n:6,.0f} input tokens/reply  "
+              f"{done * 60 / elapsed:,.0f} replies/min")
+    print(f"final batch size: {sizer.size}")
+
+
+def bench_streaming(n: int, latency: float = 0.5, concurrency: int = 8):
+    """Time until the first reply text is visible: whole replies vs streamed tokens"""
+    from llm_utils import generate_replies, stream_replies
+
+    tweets = make_corpus(n, duplicate_rate=0)
+
+    async def first_visible(replies):
+        start = time.perf_counter()
+        first = None
+        async for _ in replies:
+            first = first or time.perf_counter() - start
+        return first, time.perf_counter() - start
+
+    def fake():
+        return FakeLLM(latency=latency, per_output_token_latency=0.03)
+
+    whole = asyncio.run(first_visible(generate_replies(tweets, concurrency=concurrency, llm_client=fake())))
+    streamed = asyncio.run(first_visible(stream_replies(tweets, concurrency=concurrency, llm_client=fake())))
+
+    print(f"replies: {n}  first-token latency: {latency:.2f}s  concurrency: {concurrency}")
+    print(f"whole replies: first visible after {whole[0]:.2f}s, all done after {whole[1]:.2f}s")
+    print(f"streamed:      first visible after {streamed[0]:.2f}s, all done after {streamed[1]:.2f}s")
+
+
+def bench_watchlist(keywords: int = 200, handles: int = 50, latency: float = 0.02):
+    """Naive per-target polling vs the monitor's merged OR-queries and concurrent handle fetches"""
+    from fakes import FakeXClient
+    from monitor import TweetMonitor
+    from x_api import iter_search_tweets, iter_user_tweets
+
+    rng = random.Random(7)
+    words = [f"brand{i}" for i in range(keywords)]
+    names = [f"rival{i}" for i in range(handles)]
+    client = FakeXClient(latency=latency)
+    for _ in range(2000):
+        client.post(rng.choice(names + ["someone", "anyone"]),
+                    f"{rng.choice(HUMAN)} {rng.choice(words)} {rng.choice(words)}")
+
+    start = time.perf_counter()
+    naive_ids = set()
+    for word in words:
+        naive_ids.update(t["id"] for t in iter_search_tweets(word, total=100, client=client))
+    for name in names:
+        user = client.get_user(username=name)
+        naive_ids.update(t["id"] for t in iter_user_tweets(name, total=100, client=client, user_id=user.data.id))
+    naive_time = time.perf_counter() - start
+    naive_calls = len(client.calls)
+
+    client.calls.clear()
+    monitor = TweetMonitor(words + [f"@{name}" for name in names], max_results=100, client=client, state_path=None)
+    start = time.perf_counter()
+    monitor.poll_once()
+    fanout_time = time.perf_counter() - start
+    tweets = monitor.drain()
+    misrouted = sum(1 for t in tweets for w in t["watches"]
+                    if not (w[1:] == t["username"] if w.startswith("@") else w in t["content"]))
+
+    print(f"keywords: {keywords}  handles: {handles}  fake latency: {latency * 1000:.0f} ms/call")
+    print(f"per target: {naive_calls:5d} calls  {naive_time:6.2f}s  {len(naive_ids)} tweets")
+    print(f"watchlist:  {len(client.calls):5d} calls  {fanout_time:6.2f}s  {len(tweets)} tweets, "
+          f"{misrouted} misrouted")
+    print("(per target fetches at most 100 tweets per keyword; a merged query returns at most 100 for its whole "
+          "group, the rest arrive on later since_id polls)")
+
+
+def bench_dedup(n: int = 20_000, waves: int = 50, wave_size: int = 30, seed: int = 42):
+    """LLM calls needed with and without near-duplicate collapsing, on a corpus with copypasta waves"""
+    from dedup import NearDuplicateIndex
+
+    rng = random.Random(seed)
+    tweets = make_corpus(n, seed=seed, duplicate_rate=0)
+    for w in range(waves):
+        base = f"{rng.choice(HUMAN)} {rng.choice(QUESTION)}".split()
+        for i in range(wave_size):
+            words = list(base)
+            words.insert(rng.randrange(len(words)), rng.choice(FILLER))
+            tweets.append({"id": 10_000_000 + w * wave_size + i, "content": " ".join(words),
+                           "username": f"copy{i}", "display_name": f"copy{i}"})
+    rng.shuffle(tweets)
+
+    tweet_filter = HumanTweetFilter()
+    plain = tweet_filter.filter_for_replies(copy.deepcopy(tweets))
+
+    index = NearDuplicateIndex()
+    start = time.perf_counter()
+    collapsed = index.collapse(copy.deepcopy(tweets))
+    dedup_time = time.perf_counter() - start
+    deduped = tweet_filter.filter_for_replies(collapsed)
+    wave_clusters = sum(1 for size in index.cluster_sizes.values() if size >= index.wave_size)
+
+    print(f"tweets: {len(tweets)} ({waves} waves of {wave_size} near-identical copies)")
+    print(f"without dedup: {len(plain)} tweets to reply to")
+    print(f"with dedup:    {len(deduped)} tweets to reply to ({len(collapsed)} clusters kept, "
+          f"{wave_clusters} waves skipped)")
+    print(f"index: {len(tweets) / dedup_time:,.0f} tweets/s, {len(index)} clusters in the window")
+
+
+def bench_clients(handles: int = 50):
+    """Poll many handles back-to-back with a client per call vs the shared pooled client"""
+    from x_clients import make_client
+
+    def poll(get_client):
+        start = time.perf_counter()
+        for i in range(handles):
+            user = get_client().get_user(username=f"user{i}")
+            get_client().get_users_tweets(id=user.data.id, max_results=10)
+        return (time.perf_counter() - start) / (handles * 2)
+
+    with StubXServer() as server:
+        per_call = poll(lambda: make_client(base_url=server.url, bearer_token="stub"))
+        per_call_connections = server.connections
+
+        server.connections = 0
+        shared = make_client(base_url=server.url, bearer_token="stub")
+        pooled = poll(lambda: shared)
+        pooled_connections = server.connections
+
+    print(f"handles: {handles}  calls: {handles * 2}")
+    print(f"client per call: {per_call_connections} connections, {per_call * 1000:.2f} ms/call")
+    print(f"shared client:   {pooled_connections} connections, {pooled * 1000:.2f} ms/call")
+    print("(against api.twitter.com every new connection is also a TLS handshake)")
+
+
+def bench_priority(hours: int = 8, per_hour: int = 300, token_quota: float = 60_000, tick: float = 300,
+                   seed: int = 42):
+    """
+    Replay a day's mentions against an hourly token quota, answering in human_score
+    order (what filter_for_replies returns) vs with the ReplyScheduler
+    """
+    from llm_utils import estimate_request_tokens
+    from priority import HourlyQuota, ReplyScheduler
+
+    rng = random.Random(seed)
+    tweets = HumanTweetFilter().filter_for_replies(make_corpus(hours * per_hour * 3, seed=seed))
+    tweets = tweets[:hours * per_hour]
+    start = time.time() - hours * 3600 - 2 * 3600
+    for tweet in tweets:
+        tweet["arrival"] = start + rng.uniform(0, hours * 3600)
+        tweet["created_at"] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(tweet["arrival"]))
+        tweet["like_count"] = int(rng.paretovariate(1.1)) - 1
+        tweet["retweet_count"] = int(tweet["like_count"] * rng.uniform(0, 0.3))
+        tweet["reply_count"] = int(tweet["like_count"] * rng.uniform(0, 0.2))
+    tweets.sort(key=lambda t: t["arrival"])
+    engagement = sorted(t["like_count"] + 2 * t["retweet_count"] + 3 * t["reply_count"] for t in tweets)
+    popular_cutoff = engagement[int(len(engagement) * 0.9)]
+
+    def cost(tweet):
+        return estimate_request_tokens(tweet["content"])
+
+    def replay(plan):
+        backlog, answered = [], []
+        arrived = 0
+        now = start
+        while now < start + (hours + 2) * 3600:
+            while arrived < len(tweets) and tweets[arrived]["arrival"] <= now:
+                backlog.append(tweets[arrived])
+                arrived += 1
+            ready, backlog = plan(backlog, now)
+            answered.extend((tweet, now - tweet["arrival"]) for tweet in ready)
+            now += tick
+        return answered
+
+    quota = HourlyQuota(token_quota)
+
+    def by_human_score(backlog, now):
+        ready, rest = [], []
+        budget = quota.remaining(now)
+        for tweet in sorted(backlog, key=lambda t: t["human_score"], reverse=True):
+            if cost(tweet) <= budget:
+                budget -= cost(tweet)
+                quota.spend(cost(tweet), now)
+                ready.append(tweet)
+            else:
+                rest.append(tweet)
+        return ready, rest
+
+    scheduler = ReplyScheduler(token_quota=token_quota)
+
+    def prioritized(backlog, now):
+        ready, deferred, _ = scheduler.plan_generation(backlog, cost, now=now)
+        return ready, deferred
+
+    print(f"{len(tweets)} reply-worthy mentions over {hours}h, {token_quota:,.0f} tokens/hour, planned every "
+          f"{tick:.0f}s")
+    for label, plan in (("human_score order", by_human_score), ("priority scheduler", prioritized)):
+        answered = replay(plan)
+        delays = [delay for _, delay in answered]
+        popular = sum(1 for tweet, _ in answered
+                      if tweet["like_count"] + 2 * tweet["retweet_count"] + 3 * tweet["reply_count"] >= popular_cutoff)
+        stale = sum(1 for delay in delays if delay > scheduler.max_wait)
+        print(f"{label:19} answered {len(answered):5}  top-10% engagement {popular:4}  "
+              f"delay p50 {percentile(delays, 50) / 60:5.1f} min  p90 {percentile(delays, 90) / 60:5.1f} min  "
+              f"answered after >{scheduler.max_wait / 60:.0f} min {stale:5}")
+
+
+def make_labeled(n: int, seed: int = 42, noise: float = 0.02) -> Tuple[List[str], List[int]]:
+    """n perturbed KEEP/SKIP/promotional/bot tweets with 1 (reply) / 0 (skip) labels, `noise` of them flipped"""
+    rng = random.Random(seed)
+    pools = [(KEEP, 1, 0.45), (SKIP, 0, 0.25), (PROMOTIONAL, 0, 0.2), (BOT, 0, 0.1)]
+    texts, labels = [], []
+    for _ in range(n):
+        pool, label, _ = rng.choices(pools, [weight for _, _, weight in pools])[0]
+        words = rng.choice(pool).split()
+        for _ in range(rng.randint(0, 2)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(FILLER))
+        texts.append(" ".join(words))
+        labels.append(label if rng.random() >= noise else 1 - label)
+    return texts, labels
+
+
+def bench_classifier(n: int = 20_000, seed: int = 42):
+    """HumanTweetFilter alone vs gated by the local classifier, on held-out labeled tweets"""
+    from classifier import ReplyClassifier, choose_threshold, evaluate, filter_passed, precision_recall, print_report
+
+    train_texts, train_labels = make_labeled(n, seed=seed)
+    test_texts, test_labels = make_labeled(n // 4, seed=seed + 1)
+    start = time.perf_counter()
+    model = ReplyClassifier().fit(train_texts, train_labels)
+    train_time = time.perf_counter() - start
+
+    passed = filter_passed(train_texts)
+    gated = [(text, label) for text, label, ok in zip(train_texts, train_labels, passed) if ok]
+    model.threshold = choose_threshold([model.predict_proba(text) for text, _ in gated],
+                                       [label for _, label in gated],
+                                       precision_recall(passed, train_labels)["precision"])
+
+    print(f"trained on {n} labeled tweets in {train_time:.1f}s, threshold {model.threshold:.3f}; "
+          f"scored on {len(test_texts)} held out")
+    print_report(evaluate(model, test_texts, test_labels))
+
+
+def time_import(statement: str, runs: int = 5) -> float:
+    """Median seconds `statement` takes in a fresh interpreter (interpreter startup excluded)"""
+    code = f"import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)"
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark")}
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        samples.append(float(out.stdout.split()[-1]))
+    return percentile(samples, 50)
+
+
+def bench_imports(runs: int = 5):
+    """Cold import time of each entry point, with and without building its LLM client up front"""
+    cases = [
+        ("app.py (page)", "import app", None),
+        ("llm_utils", "import llm_utils", "import llm_utils; llm_utils.get_llm()"),
+        ("test1 + HumanTweetFilter()", "import test1; test1.HumanTweetFilter()", None),
+        ("worker", "import worker", "import worker, llm_utils; llm_utils.get_llm()"),
+    ]
+    print(f"median of {runs} fresh interpreters")
+    print(f"{'':28} {'lazy':>9} {'eager':>9}")
+    for label, lazy, eager in cases:
+        lazy_time = time_import(lazy, runs)
+        line = f"{label:28} {lazy_time * 1000:7.0f}ms"
+        if eager:
+            eager_time = time_import(eager, runs)
+            line += f" {eager_time * 1000:7.0f}ms  ({eager_time - lazy_time:.2f}s saved at startup)"
+        print(line)
+    print("eager = also building the ChatOpenAI client, which used to be built at import")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the filter and reply pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    suite_parser = subparsers.add_parser("suite", help="Filter micro-benchmarks + end-to-end pipeline, "
+                                                      "with saved results and baseline comparison")
+    suite_parser.add_argument("-n", "--tweets", type=int, default=20_000, help="Corpus size for the filter checks")
+    suite_parser.add_argument("--pipeline-tweets", type=int, default=500, help="Tweets through the pipeline")
+    suite_parser.add_argument("--llm-latency", type=float, default=0.2, help="Fake LLM latency per call (s)")
+    suite_parser.add_argument("--x-latency", type=float, default=0.01, help="Fake X API latency per call (s)")
+    suite_parser.add_argument("--save", help="Write results to this JSON file")
+    suite_parser.add_argument("--baseline", help="Compare against results saved earlier with --save")
+    suite_parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed slowdown before failing")
+
+    filter_parser = subparsers.add_parser("filter", help="Per-tweet vs batch filter scoring")
+    filter_parser.add_argument("-n", "--tweets", type=int, default=100_000, help="Corpus size")
+    filter_parser.add_argument("-k", "--top-k", type=int, default=None, help="Keep only the best k tweets")
+    filter_parser.add_argument("--seed", type=int, default=42, help="Corpus random seed")
+    filter_parser.add_argument("--duplicate-rate", type=float, default=0.1, help="Fraction of repeated tweet texts")
+
+    replies_parser = subparsers.add_parser("replies", help="Serial vs concurrent reply generation on a fake LLM")
+    replies_parser.add_argument("-n", "--tweets", type=int, default=50, help="Number of replies")
+    replies_parser.add_argument("--latency", type=float, default=0.2, help="Fake LLM latency per call (s)")
+    replies_parser.add_argument("-c", "--concurrency", type=int, default=10, help="Requests in flight")
+
+    batch_parser = subparsers.add_parser("batch", help="One request per tweet vs multi-tweet batches on a fake LLM")
+    batch_parser.add_argument("-n", "--tweets", type=int, default=60, help="Number of replies")
+    batch_parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM latency per call (s)")
+    batch_parser.add_argument("-c", "--concurrency", type=int, default=2, help="Requests in flight")
+    batch_parser.add_argument("--drop", type=float, default=0.0,
+                              help="Fraction of each batch the fake leaves out (forces per-tweet fallback)")
+
+    stream_parser = subparsers.add_parser("stream", help="Time to first visible reply, whole vs streamed")
+    stream_parser.add_argument("-n", "--tweets", type=int, default=24, help="Number of replies")
+    stream_parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM first-token latency (s)")
+    stream_parser.add_argument("-c", "--concurrency", type=int, default=8, help="Requests in flight")
+
+    watch_parser = subparsers.add_parser("watchlist", help="Per-target polling vs merged watchlist polling")
+    watch_parser.add_argument("--keywords", type=int, default=200, help="Watched keywords")
+    watch_parser.add_argument("--handles", type=int, default=50, help="Watched handles")
+    watch_parser.add_argument("--latency", type=float, default=0.02, help="Fake X API latency per call (s)")
+
+    dedup_parser = subparsers.add_parser("dedup", help="Replies needed with and without near-duplicate collapsing")
+    dedup_parser.add_argument("-n", "--tweets", type=int, default=20_000, help="Corpus size before waves")
+    dedup_parser.add_argument("--waves", type=int, default=50, help="Copypasta waves to inject")
+    dedup_parser.add_argument("--wave-size", type=int, default=30, help="Copies per wave")
+
+    prompt_parser = subparsers.add_parser("prompt", help="Flat prompt vs cached system prompt on a fake LLM")
+    prompt_parser.add_argument("-n", "--tweets", type=int, default=200, help="Number of replies")
+    prompt_parser.add_argument("--per-token-latency", type=float, default=0.0005,
+                               help="Fake LLM latency per uncached input token (s)")
+    prompt_parser.add_argument("--min-cache-tokens", type=int, default=0,
+                               help="Shortest prefix the fake caches (OpenAI: 1024)")
+
+    priority_parser = subparsers.add_parser("priority", help="Reply order under an hourly token quota: "
+                                                             "human_score vs priority scheduler")
+    priority_parser.add_argument("--hours", type=int, default=8, help="Hours of simulated mentions")
+    priority_parser.add_argument("--per-hour", type=int, default=300, help="Reply-worthy mentions per hour")
+    priority_parser.add_argument("--token-quota", type=float, default=60_000, help="LLM tokens per hour")
+
+    classifier_parser = subparsers.add_parser("classifier", help="Filter alone vs filter + local classifier")
+    classifier_parser.add_argument("-n", "--tweets", type=int, default=20_000, help="Labeled training tweets")
+
+    imports_parser = subparsers.add_parser("imports", help="Cold import time with lazy vs eager clients")
+    imports_parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+
+    clients_parser = subparsers.add_parser("clients", help="Client per call vs shared pooled X API client")
+    clients_parser.add_argument("--handles", type=int, default=50, help="Handles to poll back-to-back")
+    args = parser.parse_args()
+
+    if args.command == "suite":
+        sys.exit(bench_suite(args.tweets, args.pipeline_tweets, args.llm_latency, args.x_latency,
+                             args.save, args.baseline, args.tolerance))
+    elif args.command == "filter":
+        bench_batch(args.tweets, args.top_k, args.seed, args.duplicate_rate)
+    elif args.command == "replies":
+        bench_replies(args.tweets, args.latency, args.concurrency)
+    elif args.command == "batch":
+        bench_batched(args.tweets, args.latency, args.concurrency, args.drop)
+    elif args.command == "stream":
+        bench_streaming(args.tweets, args.latency, args.concurrency)
+    elif args.command == "watchlist":
+        bench_watchlist(args.keywords, args.handles, args.latency)
+    elif args.command == "dedup":
+        bench_dedup(args.tweets, args.waves, args.wave_size)
+    elif args.command == "prompt":
+        bench_prompt(args.tweets, args.per_token_latency, args.min_cache_tokens)
+    elif args.command == "priority":
+        bench_priority(args.hours, args.per_hour, args.token_quota)
+    elif args.command == "classifier":
+        bench_classifier(args.tweets)
+    elif args.command == "imports":
+        bench_imports(args.runs)
+    elif args.command == "clients":
+        bench_clients(args.handles)
@@ -0,0 +1,240 @@
+import argparse
+import json
+import math
+import random
+import re
+import time
+import zlib
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+import numpy as np
+
+import metrics
+
+_TOKEN = re.compile(r"https?://\S+|[@#$]?\w+(?:'\w+)?|[?!]")
+
+
+class ReplyClassifier:
+    """
+    Hashed-feature logistic regression predicting whether a tweet is worth a reply
+
+    Each tweet becomes a set of binary features (lowercased words and word
+    pairs, with links, @mentions and numbers collapsed, plus length, hashtag
+    and caps buckets) hashed into 2**bits weights. Words are matched whole,
+    so "ad" and "already" are unrelated, unlike in HumanTweetFilter's
+    substring keywords. Scoring a tweet is one regex pass, a few dozen
+    crc32s and a sum, tens of microseconds on a CPU.
+
+    Meant to run after HumanTweetFilter.filter_for_replies and before reply
+    generation: gate() keeps tweets whose reply probability is at least
+    `threshold` and drops the rest before they cost an LLM call.
+    """
+
+    def __init__(self, bits: int = 18, threshold: float = 0.5):
+        self.bits = bits
+        self.threshold = threshold
+        self.weights = np.zeros(1 << bits, dtype=np.float32)
+        self.bias = 0.0
+
+    def features(self, text: str) -> List[int]:
+        """Hashed indices of the tweet's features, without duplicates"""
+        tokens = []
+        for token in _TOKEN.findall(text.lower()):
+            if token.startswith("http"):
+                token = "<url>"
+            elif token.startswith("@"):
+                token = "<mention>"
+            elif token.isdigit():
+                token = "<num>"
+            tokens.append(token)
+        names = ["w:" + token for token in tokens]
+        names += [f"b:{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        names.append(f"len:{min(len(text) // 40, 7)}")
+        names.append(f"tags:{min(sum(1 for t in tokens if t.startswith('#')), 5)}")
+        names.append(f"caps:{min(sum(1 for w in text.split() if len(w) > 3 and w.isupper()), 3)}")
+        mask = (1 << self.bits) - 1
+        return list({zlib.crc32(name.encode("utf-8")) & mask for name in names})
+
+    def predict_proba(self, text: str) -> float:
+        z = self.bias + float(self.weights[self.features(text)].sum())
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+    def fit(self, texts: List[str], labels: List[int], epochs: int = 5, learning_rate: float = 0.5,
+            l2: float = 1e-6, seed: int = 1) -> "ReplyClassifier":
+        """Train with plain SGD on the log loss; labels are 1 (reply) or 0 (skip)"""
+        rows = [np.array(self.features(text), dtype=np.intp) for text in texts]
+        order = list(range(len(rows)))
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            rate = learning_rate / (1 + epoch)
+            for i in order:
+                idx = rows[i]
+                z = self.bias + float(self.weights[idx].sum())
+                p = 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+                gradient = p - labels[i]
+                self.weights[idx] -= rate * (gradient + l2 * self.weights[idx])
+                self.bias -= rate * gradient
+        return self
+
+    @metrics.timed("classify")
+    def gate(self, tweets: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Split tweets into (kept, rejected), setting "reply_probability" on each"""
+        kept, rejected = [], []
+        for tweet in tweets:
+            tweet["reply_probability"] = round(self.predict_proba(tweet["content"]), 3)
+            (kept if tweet["reply_probability"] >= self.threshold else rejected).append(tweet)
+        if rejected:
+            metrics.inc("filter_drops_total", len(rejected), reason="classifier")
+        return kept, rejected
+
+    def save(self, path: str):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias, threshold=self.threshold, bits=self.bits)
+
+    @classmethod
+    def load(cls, path: str) -> "ReplyClassifier":
+        with np.load(path) as data:
+            model = cls(bits=int(data["bits"]), threshold=float(data["threshold"]))
+            model.weights = data["weights"].astype(np.float32)
+            model.bias = float(data["bias"])
+        return model
+
+
+def load_labeled(path: str) -> Tuple[List[str], List[int]]:
+    """
+    Read labeled tweets from a JSONL file, one {"content": ..., "label": ...} per line
+
+    The label is "keep"/"skip", true/false or 1/0.
+    """
+    texts, labels = [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            label = record["label"]
+            texts.append(record["content"])
+            labels.append(int(label == "keep" if isinstance(label, str) else bool(label)))
+    return texts, labels
+
+
+def precision_recall(predicted: Iterable[bool], labels: Iterable[int]) -> Dict[str, float]:
+    """Precision, recall and number of predicted keeps (LLM calls) and wasted keeps"""
+    pairs = list(zip(predicted, labels))
+    kept = sum(1 for p, _ in pairs if p)
+    hits = sum(1 for p, y in pairs if p and y)
+    positives = sum(1 for _, y in pairs if y)
+    return {
+        "precision": hits / kept if kept else 1.0,
+        "recall": hits / positives if positives else 1.0,
+        "calls": kept,
+        "wasted": kept - hits,
+    }
+
+
+def choose_threshold(probabilities: List[float], labels: List[int], min_precision: float) -> Optional[float]:
+    """
+    Threshold with the best F1 among those whose precision is at least `min_precision`
+
+    None when no threshold reaches it (or there is nothing to score), rather
+    than a threshold that would reject every tweet.
+    """
+    ranked = sorted(zip(probabilities, labels), reverse=True)
+    positives = sum(labels)
+    best, best_f1 = None, -1.0
+    hits = 0
+    for kept, (probability, label) in enumerate(ranked, 1):
+        hits += label
+        # gate() keeps every tweet scoring >= the threshold, so only cut between distinct probabilities
+        if kept < len(ranked) and ranked[kept][0] == probability:
+            continue
+        f1 = 2 * hits / (kept + positives)
+        if hits / kept >= min_precision and f1 > best_f1:
+            best, best_f1 = probability, f1
+    return best
+
+
+def filter_passed(texts: List[str], min_human_score: float = 0.3) -> List[bool]:
+    """Whether each text gets through HumanTweetFilter.filter_for_replies"""
+    from test1 import HumanTweetFilter
+
+    tweets = [{"id": i, "content": text} for i, text in enumerate(texts)]
+    passed = {tweet["id"] for tweet in HumanTweetFilter().filter_for_replies(tweets, min_human_score)}
+    return [i in passed for i in range(len(texts))]
+
+
+def evaluate(model: ReplyClassifier, texts: List[str], labels: List[int],
+             min_human_score: float = 0.3) -> Dict[str, Dict[str, float]]:
+    """Compare HumanTweetFilter alone, the filter gated by the classifier, and the classifier alone"""
+    passed = filter_passed(texts, min_human_score)
+
+    start = time.perf_counter()
+    probabilities = [model.predict_proba(text) for text in texts]
+    per_tweet = (time.perf_counter() - start) / max(1, len(texts))
+    classified = [p >= model.threshold for p in probabilities]
+
+    return {
+        "filter": precision_recall(passed, labels),
+        "filter+classifier": precision_recall([p and c for p, c in zip(passed, classified)], labels),
+        "classifier": {**precision_recall(classified, labels), "us_per_tweet": per_tweet * 1e6},
+    }
+
+
+def print_report(report: Dict[str, Dict[str, float]]):
+    for name, scores in report.items():
+        line = (f"{name:18} precision {scores['precision']:.3f}  recall {scores['recall']:.3f}  "
+                f"LLM calls {scores['calls']:6}  wasted {scores['wasted']:6}")
+        if "us_per_tweet" in scores:
+            line += f"  {scores['us_per_tweet']:.1f} us/tweet"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train and evaluate the local reply-worthiness classifier")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="Fit a model on labeled keep/skip tweets")
+    train_parser.add_argument("data", help="JSONL file of {\"content\", \"label\"} records")
+    train_parser.add_argument("-o", "--out", default="reply_classifier.npz", help="Where to save the model")
+    train_parser.add_argument("--bits", type=int, default=18, help="Feature hash size (2**bits weights)")
+    train_parser.add_argument("--epochs", type=int, default=5, help="Passes over the training data")
+    train_parser.add_argument("--holdout", type=float, default=0.2,
+                              help="Fraction held out to pick the threshold and report scores")
+    train_parser.add_argument("--min-precision", type=float, default=None,
+                              help="Precision the threshold must reach on the holdout "
+                                   "(default: HumanTweetFilter's precision there)")
+
+    eval_parser = subparsers.add_parser("eval", help="Score a saved model against HumanTweetFilter")
+    eval_parser.add_argument("data", help="JSONL file of {\"content\", \"label\"} records")
+    eval_parser.add_argument("-m", "--model", default="reply_classifier.npz", help="Saved model")
+    args = parser.parse_args()
+
+    texts, labels = load_labeled(args.data)
+    if args.command == "train":
+        order = list(range(len(texts)))
+        random.Random(1).shuffle(order)
+        split = int(len(order) * (1 - args.holdout))
+        train, held = order[:split], order[split:]
+        model = ReplyClassifier(bits=args.bits).fit([texts[i] for i in train], [labels[i] for i in train],
+                                                    epochs=args.epochs)
+        if held:
+            # The model only sees tweets the filter kept, so pick its threshold on those
+            held_texts, held_labels = [texts[i] for i in held], [labels[i] for i in held]
+            passed = filter_passed(held_texts)
+            gated = [(text, label) for text, label, ok in zip(held_texts, held_labels, passed) if ok]
+            min_precision = args.min_precision
+            if min_precision is None:
+                min_precision = precision_recall(passed, held_labels)["precision"]
+            threshold = choose_threshold([model.predict_proba(text) for text, _ in gated],
+                                         [label for _, label in gated], min_precision)
+            if threshold is None:
+                parser.exit(1, f"No threshold reaches precision {min_precision:.3f} on the {len(gated)} held-out "
+                               "tweets the filter kept; not saving a model that would reject every tweet\n")
+            model.threshold = threshold
+            print(f"trained on {len(train)}, threshold {model.threshold:.3f} "
+                  f"(precision >= {min_precision:.3f} on {len(held)} held out)")
+            print_report(evaluate(model, held_texts, held_labels))
+        model.save(args.out)
+        print(f"Saved model to {args.out}")
+    else:
+        print_report(evaluate(ReplyClassifier.load(args.model), texts, labels))
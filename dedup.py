@@ -0,0 +1,165 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+_URL = re.compile(r"https?://\S+")
+_MENTION = re.compile(r"@\w+")
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, k: int = 2) -> List[str]:
+    """Word k-grams of a tweet with case, links, @mentions and punctuation stripped"""
+    words = _WORD.findall(_MENTION.sub(" ", _URL.sub(" ", text.lower())))
+    if len(words) < k:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + k]) for i in range(len(words) - k + 1)]
+
+
+class NearDuplicateIndex:
+    """
+    Streaming MinHash LSH index over the most recent `window` clusters
+
+    Every tweet gets a `num_perm` MinHash signature of its word shingles,
+    split into `bands` LSH bands. Indexed tweets sharing a band are
+    candidates, and a candidate whose estimated Jaccard similarity is at
+    least `threshold` puts the new tweet in its cluster. Memory is bounded by
+    the window: the oldest clusters are evicted as new ones arrive.
+
+    A cluster that grows to `wave_size` tweets is treated as a spam or
+    copypasta wave.
+    """
+
+    def __init__(self, threshold: float = 0.6, num_perm: int = 64, bands: int = 16, window: int = 50_000,
+                 wave_size: int = 5, shingle_size: int = 2, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.window = window
+        self.wave_size = wave_size
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # Multiply-shift hashing: (a * x + b) >> 32 with odd 64-bit a
+        self._a = rng.randint(0, 2 ** 63, num_perm, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.randint(0, 2 ** 63, num_perm, dtype=np.int64).astype(np.uint64)
+        # Signatures of indexed tweets live in rows of one matrix (grown by doubling) so
+        # candidates are scored with a single fancy-indexed comparison
+        self._signatures = np.zeros((min(window + 1, 1024), num_perm), dtype=np.uint32)
+        self._free: List[int] = list(range(len(self._signatures) - 1, -1, -1))
+        self._entries: "OrderedDict[Any, int]" = OrderedDict()
+        # Ids of the most recent `window` tweets that joined someone else's cluster
+        self._members: "OrderedDict[Any, Any]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, bytes], set] = {}
+        self.cluster_sizes: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of the text, or None when it has no words to compare"""
+        grams = shingles(text, self.shingle_size)
+        if not grams:
+            return None
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "little") for g in grams),
+            dtype=np.uint64, count=len(grams),
+        )
+        return ((hashes[:, None] * self._a + self._b) >> np.uint64(32)).min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def _match(self, signature: np.ndarray) -> Optional[Any]:
+        candidates = list(dict.fromkeys(entry_id for key in self._band_keys(signature)
+                                        for entry_id in self._buckets.get(key, ())))
+        if not candidates:
+            return None
+        rows = np.fromiter((self._entries[c] for c in candidates), dtype=np.intp, count=len(candidates))
+        scores = (self._signatures[rows] == signature).mean(axis=1)
+        best = int(scores.argmax())
+        return candidates[best] if scores[best] >= self.threshold else None
+
+    def add(self, tweet_id, text: str) -> Tuple[Any, bool]:
+        """
+        Index a tweet and return (cluster_id, is_representative)
+
+        The cluster id is the id of the first tweet seen in the cluster. Only
+        that first tweet is kept in the index; later members are compared
+        against it, which keeps buckets small during a large wave. A tweet
+        delivered again (refetched, or polled by another session) gets the
+        same answer as the first time and does not grow its cluster.
+        """
+        signature = self.signature(text)
+        with self._lock:
+            if signature is None:
+                return tweet_id, True
+            if tweet_id in self._entries:
+                return tweet_id, True
+            if tweet_id in self._members:
+                return self._members[tweet_id], False
+            cluster_id = self._match(signature)
+            if cluster_id is not None:
+                self.cluster_sizes[cluster_id] += 1
+                self._members[tweet_id] = cluster_id
+                if len(self._members) > self.window:
+                    self._members.popitem(last=False)
+                return cluster_id, False
+
+            self.cluster_sizes[tweet_id] = 1
+            if not self._free:
+                size = len(self._signatures)
+                self._signatures = np.concatenate([self._signatures, np.zeros_like(self._signatures)])
+                self._free = list(range(2 * size - 1, size - 1, -1))
+            row = self._free.pop()
+            self._signatures[row] = signature
+            self._entries[tweet_id] = row
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, set()).add(tweet_id)
+            while len(self._entries) > self.window:
+                self._evict()
+            return tweet_id, True
+
+    def _evict(self):
+        entry_id, row = self._entries.popitem(last=False)
+        self._free.append(row)
+        for key in self._band_keys(self._signatures[row]):
+            bucket = self._buckets[key]
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._buckets[key]
+        del self.cluster_sizes[entry_id]
+
+    def is_wave(self, cluster_id) -> bool:
+        with self._lock:
+            return self.cluster_sizes.get(cluster_id, 0) >= self.wave_size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def collapse(self, tweets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Keep one tweet per near-duplicate cluster
+
+        Tweets joining a cluster that already has a representative (in this
+        call or an earlier one) are dropped, and clusters that have become a
+        wave are dropped entirely. A representative delivered again is kept. Kept tweets get "cluster_id" and
+        "cluster_size" keys.
+        """
+        kept = []
+        for tweet in tweets:
+            cluster_id, representative = self.add(tweet["id"], tweet["content"])
+            if representative:
+                tweet["cluster_id"] = cluster_id
+                kept.append(tweet)
+        with self._lock:
+            result = []
+            for tweet in kept:
+                size = self.cluster_sizes.get(tweet["cluster_id"], 1)
+                if size < self.wave_size:
+                    tweet["cluster_size"] = size
+                    result.append(tweet)
+        return result
@@ -0,0 +1,311 @@
+import asyncio
+import json
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import tweepy
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+# Local stand-ins for the external services, used by benchmarks and dry runs
+
+
+class FakeLLM:
+    """
+    Chat model stand-in with a canned reply and a token-aware latency
+
+    Each call costs `latency` plus `per_token_latency` for every input token
+    not served from a simulated prefix cache: prompts are split into blocks
+    of `cache_block` tokens and a block is cached once the same prefix up to
+    and including it has been seen, like provider-side prompt caching.
+    Prefixes shorter than `min_cache_tokens` are never cached. Output costs
+    `per_output_token_latency` per token. Responses carry usage_metadata like
+    the real chat models do.
+
+    A batch request (a JSON array of {"id", "text"} as the last message) is
+    answered with a JSON array of {"id", "reply"}; `batch_drop` leaves out
+    that fraction of the ids to exercise the per-tweet fallback.
+    """
+
+    def __init__(self, latency=0.5, reply="yeah ngl that's kinda fair tbh", per_token_latency=0.0,
+                 cache_block=16, min_cache_tokens=0, per_output_token_latency=0.0, batch_drop=0.0):
+        self.latency = latency
+        self.reply = reply
+        self.per_token_latency = per_token_latency
+        self.per_output_token_latency = per_output_token_latency
+        self.batch_drop = batch_drop
+        self.cache_block = cache_block
+        self.min_cache_tokens = min_cache_tokens
+        self.calls = 0
+        self._prefixes = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _tokens(prompt):
+        if isinstance(prompt, str):
+            text = prompt
+        else:
+            text = "\n".join(f"{message.type}: {message.content}" for message in prompt)
+        return re.findall(r"\w+|[^\w\s]", text)
+
+    def _content(self, prompt):
+        if isinstance(prompt, str):
+            return self.reply
+        try:
+            items = json.loads(prompt[-1].content)
+        except ValueError:
+            return self.reply
+        if not isinstance(items, list):
+            return self.reply
+        keep = len(items) - int(len(items) * self.batch_drop)
+        return json.dumps([{"id": item["id"], "reply": self.reply} for item in items[:keep]])
+
+    def _respond(self, prompt):
+        tokens = self._tokens(prompt)
+        cached = 0
+        with self._lock:
+            self.calls += 1
+            prefix = hash(())
+            for end in range(self.cache_block, len(tokens) + 1, self.cache_block):
+                prefix = hash((prefix, tuple(tokens[end - self.cache_block:end])))
+                if prefix in self._prefixes:
+                    cached = end
+                elif end >= self.min_cache_tokens:
+                    self._prefixes.add(prefix)
+            if cached < self.min_cache_tokens:
+                cached = 0
+        content = self._content(prompt)
+        output_tokens = len(self._tokens(content))
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": len(tokens),
+            "output_tokens": output_tokens,
+            "total_tokens": len(tokens) + output_tokens,
+            "input_token_details": {"cache_read": cached},
+        })
+        # Delay until the first output token
+        return message, self.latency + self.per_token_latency * (len(tokens) - cached)
+
+    def invoke(self, prompt):
+        message, delay = self._respond(prompt)
+        time.sleep(delay + self.per_output_token_latency * message.usage_metadata["output_tokens"])
+        return message
+
+    async def ainvoke(self, prompt):
+        message, delay = self._respond(prompt)
+        await asyncio.sleep(delay + self.per_output_token_latency * message.usage_metadata["output_tokens"])
+        return message
+
+    def _chunks(self, message):
+        # Usage arrives on the last chunk, as with stream_usage on the real models
+        pieces = re.findall(r"\s*\S+", message.content)
+        return [AIMessageChunk(content=piece, usage_metadata=message.usage_metadata if i == len(pieces) - 1 else None)
+                for i, piece in enumerate(pieces)]
+
+    def stream(self, prompt):
+        message, delay = self._respond(prompt)
+        time.sleep(delay)
+        for chunk in self._chunks(message):
+            yield chunk
+            time.sleep(self.per_output_token_latency)
+
+    async def astream(self, prompt):
+        message, delay = self._respond(prompt)
+        await asyncio.sleep(delay)
+        for chunk in self._chunks(message):
+            yield chunk
+            await asyncio.sleep(self.per_output_token_latency)
+
+
+class FakeXClient:
+    """
+    In-memory stand-in for tweepy.Client's read endpoints
+
+    Tweets are added with post(); search_recent_tweets and get_users_tweets
+    honour since_id, max_results and pagination tokens and return newest
+    first, like the API.
+    Every call is recorded in `calls` as (endpoint, params).
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.users = {}
+        self.tweets = []
+        self.calls = []
+        self._next_id = 1_000_000
+
+    def post(self, username, text, public_metrics=None):
+        user = self.users.setdefault(username, {"id": str(len(self.users) + 1), "username": username,
+                                                "name": username.title()})
+        self._next_id += 1
+        tweet = {
+            "id": str(self._next_id),
+            "text": text,
+            "author_id": user["id"],
+            "conversation_id": str(self._next_id),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+            "edit_history_tweet_ids": [str(self._next_id)],
+            "public_metrics": public_metrics or {"retweet_count": 0, "like_count": 0, "reply_count": 0},
+        }
+        self.tweets.append(tweet)
+        return tweet
+
+    def _response(self, matches, max_results, since_id, token=None):
+        matches = [t for t in reversed(self.tweets) if matches(t)
+                   and (since_id is None or int(t["id"]) > int(since_id))]
+        offset = int(token or 0)
+        page = matches[offset:offset + max_results]
+        if not page:
+            return tweepy.Response(None, {}, [], {"result_count": 0})
+        authors = {t["author_id"] for t in page}
+        users = [tweepy.User(u) for u in self.users.values() if u["id"] in authors]
+        meta = {"result_count": len(page), "newest_id": page[0]["id"], "oldest_id": page[-1]["id"]}
+        if offset + max_results < len(matches):
+            meta["next_token"] = str(offset + max_results)
+        return tweepy.Response([tweepy.Tweet(t) for t in page], {"users": users}, [], meta)
+
+    def search_recent_tweets(self, query, max_results=10, since_id=None, next_token=None, **params):
+        self.calls.append(("search_recent_tweets", dict(params, query=query, since_id=since_id)))
+        time.sleep(self.latency)
+        # Quoted phrases and bare words are OR'd together; operators (-is:retweet, lang:en) are ignored
+        terms = [phrase or word for phrase, word in re.findall(r'"([^"]+)"|([^\s()"]+)', query)
+                 if phrase or (word != "OR" and ":" not in word)]
+        patterns = [re.compile(r"(?<!\w)" + re.escape(term) + r"(?!\w)", re.IGNORECASE) for term in terms]
+        return self._response(lambda t: any(p.search(t["text"]) for p in patterns),
+                              max_results, since_id, next_token)
+
+    def get_user(self, username, **params):
+        self.calls.append(("get_user", dict(params, username=username)))
+        time.sleep(self.latency)
+        user = self.users.get(username)
+        return tweepy.Response(tweepy.User(user) if user else None, {}, [], {})
+
+    def get_users(self, usernames, **params):
+        self.calls.append(("get_users", dict(params, usernames=list(usernames))))
+        time.sleep(self.latency)
+        users = [tweepy.User(self.users[name]) for name in usernames if name in self.users]
+        return tweepy.Response(users or None, {}, [], {})
+
+    def get_users_tweets(self, id, max_results=10, since_id=None, pagination_token=None, **params):
+        self.calls.append(("get_users_tweets", dict(params, id=id, since_id=since_id)))
+        time.sleep(self.latency)
+        return self._response(lambda t: t["author_id"] == str(id), max_results, since_id, pagination_token)
+
+
+class StubXServer:
+    """
+    Local HTTP/1.1 server answering the X API v2 routes the app uses
+
+    Counts TCP connections and requests so connection reuse can be measured
+    (each new connection to the real API is a TLS handshake). Responses carry
+    x-rate-limit-* headers; `latency` delays every response and the first
+    `fail_posts` POSTs fail with a 503. The next `lost_posts` POSTs are
+    posted but still answered with a 503, like a reply that went through
+    before the API timed out. Posted replies show up in the timeline of the
+    authenticated user (/2/users/me, id `ME`). Point a client at
+    it with x_clients.make_client(base_url=server.url).
+    """
+
+    ME = "999"
+
+    def __init__(self, latency=0.0, rate_limit=450, fail_posts=0, lost_posts=0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.fail_posts = fail_posts
+        self.lost_posts = lost_posts
+        self.connections = 0
+        self.requests = 0
+        self.posted = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out as separate writes; don't let Nagle stall the second one
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                with stub._lock:
+                    stub.requests += 1
+                    remaining = max(0, stub.rate_limit - stub.requests)
+                time.sleep(stub.latency)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("x-rate-limit-limit", str(stub.rate_limit))
+                self.send_header("x-rate-limit-remaining", str(remaining))
+                self.send_header("x-rate-limit-reset", str(int(time.time()) + 900))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                tweet = {"id": "1", "text": "anyone else having trouble with their wallet?",
+                         "author_id": "1", "created_at": "2024-01-01T00:00:00.000Z",
+                         "edit_history_tweet_ids": ["1"]}
+                if path == "/2/users/by":
+                    usernames = parse_qs(urlsplit(self.path).query).get("usernames", [""])[0].split(",")
+                    self._reply(200, {"data": [{"id": str(i + 1), "username": name, "name": name}
+                                               for i, name in enumerate(usernames)]})
+                elif path.startswith("/2/users/by/username/"):
+                    username = path.rsplit("/", 1)[-1]
+                    self._reply(200, {"data": {"id": "1", "username": username, "name": username}})
+                elif path == "/2/users/me":
+                    self._reply(200, {"data": {"id": stub.ME, "username": "me", "name": "me"}})
+                elif path == f"/2/users/{stub.ME}/tweets":
+                    with stub._lock:
+                        replies = [{"id": str(2_000_001 + i), "text": body.get("text", ""),
+                                    "edit_history_tweet_ids": [str(2_000_001 + i)],
+                                    "referenced_tweets": [{"type": "replied_to",
+                                                           "id": body["reply"]["in_reply_to_tweet_id"]}]}
+                                   for i, body in enumerate(stub.posted) if "reply" in body]
+                    self._reply(200, {"data": replies[::-1][:100], "meta": {"result_count": len(replies)}})
+                elif path.startswith("/2/users/") or path == "/2/tweets/search/recent":
+                    self._reply(200, {"data": [tweet], "meta": {"result_count": 1, "newest_id": "1"}})
+                else:
+                    self._reply(404, {"title": "Not Found"})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with stub._lock:
+                    fail = stub.fail_posts > 0
+                    stub.fail_posts -= fail
+                    lost = not fail and stub.lost_posts > 0
+                    stub.lost_posts -= lost
+                if fail:
+                    self._reply(503, {"title": "Service Unavailable"})
+                    return
+                with stub._lock:
+                    stub.posted.append(body)
+                    tweet_id = str(2_000_000 + len(stub.posted))
+                if lost:
+                    self._reply(503, {"title": "Service Unavailable"})
+                    return
+                self._reply(201, {"data": {"id": tweet_id, "text": body.get("text", "")}})
+
+        return Handler
@@ -0,0 +1,154 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue shared by the Streamlit page and the worker
+
+    The page submits jobs (a kind plus a JSON payload) and polls them by id;
+    workers claim queued jobs oldest first, publish partial results while
+    they run and finish them with a result or an error. The database is in
+    WAL mode so any number of browser sessions and worker threads can use it
+    at once without an external broker.
+    """
+
+    def __init__(self, path: str = "jobs.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " kind TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " result TEXT,"
+                " error TEXT,"
+                " worker TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> int:
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, payload, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+                (kind, json.dumps(payload, default=str), now, now),
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker: str, kinds: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest queued job (optionally of the given kinds) for `worker`"""
+        query = "SELECT id FROM jobs WHERE status = 'queued'"
+        params: List[Any] = []
+        if kinds:
+            query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            params.extend(kinds)
+        query += " ORDER BY id LIMIT 1"
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"UPDATE jobs SET status = 'running', worker = ?, updated_at = ? WHERE id = ({query})"
+                " RETURNING id, kind, payload",
+                [worker, time.time(), *params],
+            ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "kind": row[1], "payload": json.loads(row[2])}
+
+    def progress(self, job_id: int, result: Dict[str, Any]):
+        """Publish a partial result for a running job"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET result = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+                (json.dumps(result, default=str), time.time(), job_id),
+            )
+
+    def complete(self, job_id: int, result: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(result, default=str), time.time(), job_id),
+            )
+
+    def fail(self, job_id: int, error: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                (error, time.time(), job_id),
+            )
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Status, latest (partial) result and error of a job"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT kind, status, result, error, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        kind, status, result, error, created_at, updated_at = row
+        return {"id": job_id, "kind": kind, "status": status, "result": json.loads(result) if result else None,
+                "error": error, "created_at": created_at, "updated_at": updated_at}
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def release_orphans(self) -> int:
+        """
+        Requeue jobs left 'running' by a worker process on this host that no longer exists
+
+        Returns how many jobs were requeued.
+        """
+        with self._lock, self._conn:
+            rows = self._conn.execute("SELECT id, worker FROM jobs WHERE status = 'running'").fetchall()
+            orphans = [job_id for job_id, worker in rows if dead_worker(worker)]
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'queued', worker = NULL, updated_at = ? WHERE id = ?",
+                [(time.time(), job_id) for job_id in orphans],
+            )
+        return len(orphans)
+
+    def purge(self, older_than: float = 24 * 3600) -> int:
+        """Delete finished jobs last updated more than `older_than` seconds ago"""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - older_than,),
+            ).rowcount
+
+    def close(self):
+        self._conn.close()
+
+
+def worker_name(thread: str = "main") -> str:
+    """host:pid:thread, so orphaned jobs can be traced back to a dead process"""
+    return f"{socket.gethostname()}:{os.getpid()}:{thread}"
+
+
+def dead_worker(worker: Optional[str]) -> bool:
+    """Whether a worker_name() belongs to a process on this host that no longer exists"""
+    if not worker:
+        return False
+    host, pid, _ = worker.rsplit(":", 2)
+    return host == socket.gethostname() and not _alive(int(pid))
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -1,26 +1,52 @@
 import os
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+import asyncio
+import json
+import time
+from collections import deque
+from functools import lru_cache
+from langchain_core.messages import HumanMessage, SystemMessage
 
-load_dotenv()
+import metrics
 
-llm = ChatOpenAI(
-    model="gpt-4",
-    temperature=0.7,
-    openai_api_key=os.getenv("OPENAI_API_KEY")
-)
+# Bump whenever the prompt changes so cached replies from the old prompt are not reused
+PROMPT_VERSION = "2"
 
 
-def generate_reply(tweet_text, style="Friendly"):
-    prompt = f"""
-You're a regular 20-year-old who's been using crypto wallets for a while. You tweet like you text - quick, casual, authentic. You're not trying to sell anything or sound smart.
+@lru_cache(maxsize=None)
+def get_llm():
+    """
+    Shared ChatOpenAI client, built on first use
 
-Tweet you're replying to:
-"{tweet_text}"
+    langchain_openai takes over a second to import, so it is only loaded
+    by processes that actually call the LLM.
+    """
+    from dotenv import load_dotenv
+    from langchain_openai import ChatOpenAI
 
-Write a natural reply (max 2 lines) that sounds like something you'd actually say. Think less "professional response" and more "casual conversation with someone online."
+    load_dotenv()
+    return ChatOpenAI(
+        model="gpt-4",
+        temperature=0.7,
+        # Report token usage on streamed responses too, for the hourly token quota
+        stream_usage=True,
+        openai_api_key=os.getenv("OPENAI_API_KEY")
+    )
 
-Your vibe: {style.lower()}
+
+def __getattr__(name):
+    # Keeps `llm_utils.llm` working for existing callers without building it at import
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+PERSONA = """You're a regular 20-year-old who's been using crypto wallets for a while. You tweet like you text - quick, casual, authentic. You're not trying to sell anything or sound smart."""
+
+# Everything except the tweet itself; kept in the system message so it forms
+# an identical prefix on every call for the provider's prompt caching
+GUIDELINES = """Write a natural reply (max 2 lines) to the tweet you are given that sounds like something you'd actually say. Think less "professional response" and more "casual conversation with someone online."
+
+Your vibe: {style}
 
 Language style:
 - Use contractions (don't, won't, I've, that's)
@@ -74,7 +100,427 @@ Examples:
 - Don't be the expert, be the friend who's tried stuff
 - Include small imperfections in your writing
 - Let some personality show through
-
-Write your reply now (remember: casual, authentic, like you're texting someone):
 """
-    return llm.invoke(prompt).content.strip()
\ No newline at end of file
+
+CLOSING = "Write your reply now (remember: casual, authentic, like you're texting someone):"
+
+
+@lru_cache(maxsize=None)
+def system_message(style="Friendly"):
+    """Static persona and instructions for a style, built once and reused for every tweet"""
+    return SystemMessage(content=f"{PERSONA}\n\n{GUIDELINES.format(style=style.lower())}")
+
+
+def build_messages(tweet_text, style="Friendly"):
+    return [
+        system_message(style),
+        HumanMessage(content=f'Tweet you\'re replying to:\n"{tweet_text}"\n\n{CLOSING}'),
+    ]
+
+
+class TokenAccounting:
+    """
+    Per-call token usage and latency across a batch of replies
+
+    Reads the usage_metadata the chat model returns, including input tokens
+    served from the provider's prompt cache.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def record(self, message, latency):
+        usage = getattr(message, "usage_metadata", None) or {}
+        details = usage.get("input_token_details") or {}
+        self.calls.append({
+            "input_tokens": usage.get("input_tokens", 0),
+            "cached_tokens": details.get("cache_read", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "latency": latency,
+        })
+
+    def report(self):
+        replies = len(self.calls)
+        input_tokens = sum(call["input_tokens"] for call in self.calls)
+        cached_tokens = sum(call["cached_tokens"] for call in self.calls)
+        latency = sum(call["latency"] for call in self.calls)
+        return {
+            "replies": replies,
+            "input_tokens": input_tokens,
+            "cached_tokens": cached_tokens,
+            "uncached_tokens": input_tokens - cached_tokens,
+            "output_tokens": sum(call["output_tokens"] for call in self.calls),
+            "uncached_tokens_per_reply": (input_tokens - cached_tokens) / replies if replies else 0.0,
+            "latency_per_reply": latency / replies if replies else 0.0,
+        }
+
+
+def _record(message, latency, accounting=None, stage="generate"):
+    """Report one LLM call to the metrics registry and, if given, a TokenAccounting"""
+    metrics.observe("stage_seconds", latency, stage=stage)
+    metrics.record_usage(message)
+    if accounting is not None:
+        accounting.record(message, latency)
+
+
+def generate_reply(tweet_text, style="Friendly", llm_client=None, cache=None, accounting=None):
+    if cache is not None:
+        cached = cache.get(tweet_text, style, PROMPT_VERSION)
+        if cached is not None:
+            return cached
+
+    client = llm_client or get_llm()
+    start = time.perf_counter()
+    message = client.invoke(build_messages(tweet_text, style))
+    _record(message, time.perf_counter() - start, accounting)
+    reply = message.content.strip()
+    if cache is not None:
+        cache.put(tweet_text, style, PROMPT_VERSION, reply)
+    return reply
+
+
+async def _generate_one(client, tweet, style, timeout, cache=None, accounting=None):
+    """One LLM call for one tweet; None when it fails or times out"""
+    try:
+        start = time.perf_counter()
+        message = await asyncio.wait_for(client.ainvoke(build_messages(tweet["content"], style)), timeout)
+        _record(message, time.perf_counter() - start, accounting)
+        reply = message.content.strip()
+        if cache is not None:
+            cache.put(tweet["content"], style, PROMPT_VERSION, reply)
+        return reply
+    except asyncio.TimeoutError:
+        print(f"Timed out generating reply for tweet {tweet['id']}")
+    except Exception as e:
+        print(f"Error generating reply for tweet {tweet['id']}: {e}")
+    return None
+
+
+async def generate_replies(tweets, style="Friendly", concurrency=5, timeout=60, llm_client=None, cache=None,
+                           accounting=None):
+    """
+    Generate replies for many tweets concurrently, yielding each one as it completes
+
+    At most `concurrency` LLM requests are in flight at once and each request
+    is abandoned after `timeout` seconds. Yields (tweet_id, reply) pairs in
+    completion order; reply is None when the request failed or timed out.
+    Replies found in `cache` are yielded without an LLM call.
+    """
+    client = llm_client or get_llm()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def reply_to(tweet):
+        if cache is not None:
+            cached = cache.get(tweet["content"], style, PROMPT_VERSION)
+            if cached is not None:
+                return tweet["id"], cached
+
+        async with semaphore:
+            return tweet["id"], await _generate_one(client, tweet, style, timeout, cache, accounting)
+
+    tasks = [asyncio.ensure_future(reply_to(tweet)) for tweet in tweets]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def stream_reply(tweet_text, style="Friendly", llm_client=None, cache=None):
+    """
+    Streaming generate_reply: yields the reply in pieces as the model writes it
+
+    A cached reply is yielded in one piece; a streamed one is cached once complete, unless it is empty.
+    """
+    if cache is not None:
+        cached = cache.get(tweet_text, style, PROMPT_VERSION)
+        if cached is not None:
+            yield cached
+            return
+
+    client = llm_client or get_llm()
+    pieces = []
+    with metrics.span("generate"):
+        for chunk in client.stream(build_messages(tweet_text, style)):
+            metrics.record_usage(chunk)
+            if chunk.content:
+                pieces.append(chunk.content)
+                yield chunk.content
+    reply = "".join(pieces).strip()
+    if cache is not None and reply:
+        cache.put(tweet_text, style, PROMPT_VERSION, reply)
+
+
+async def stream_replies(tweets, style="Friendly", concurrency=5, timeout=60, llm_client=None, cache=None,
+                         accounting=None):
+    """
+    Stream replies for many tweets concurrently
+
+    Yields (tweet_id, text_so_far, done) every time any reply grows, so a UI
+    can redraw each tweet's reply as its tokens arrive. The last event for a
+    tweet has done=True and the full reply as text, or None when the request
+    failed, came back empty or took longer than `timeout` seconds in total. Token usage,
+    reported on the stream's chunks, goes to `accounting` if given.
+    """
+    client = llm_client or get_llm()
+    semaphore = asyncio.Semaphore(concurrency)
+    events = asyncio.Queue()
+
+    async def stream_to(tweet):
+        if cache is not None:
+            cached = cache.get(tweet["content"], style, PROMPT_VERSION)
+            if cached is not None:
+                events.put_nowait((tweet["id"], cached, True))
+                return
+
+        async def consume():
+            text, usage = "", None
+            async for chunk in client.astream(build_messages(tweet["content"], style)):
+                metrics.record_usage(chunk)
+                if chunk.usage_metadata:
+                    usage = chunk if usage is None else usage + chunk
+                if chunk.content:
+                    text += chunk.content
+                    events.put_nowait((tweet["id"], text, False))
+            return text.strip(), usage
+
+        reply = None
+        async with semaphore:
+            try:
+                start = time.perf_counter()
+                reply, usage = await asyncio.wait_for(consume(), timeout)
+                latency = time.perf_counter() - start
+                metrics.observe("stage_seconds", latency, stage="generate")
+                if accounting is not None and usage is not None:
+                    accounting.record(usage, latency)
+                if not reply:
+                    print(f"Empty reply generated for tweet {tweet['id']}")
+                    reply = None
+                elif cache is not None:
+                    cache.put(tweet["content"], style, PROMPT_VERSION, reply)
+            except asyncio.TimeoutError:
+                print(f"Timed out generating reply for tweet {tweet['id']}")
+            except Exception as e:
+                print(f"Error generating reply for tweet {tweet['id']}: {e}")
+        events.put_nowait((tweet["id"], reply, True))
+
+    tasks = [asyncio.ensure_future(stream_to(tweet)) for tweet in tweets]
+    try:
+        finished = 0
+        while finished < len(tasks):
+            event = await events.get()
+            finished += event[2]
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+BATCH_INSTRUCTIONS = """You'll get several tweets at once as a JSON array of {{"id": ..., "text": ...}} objects. Reply to each tweet on its own, following everything above, as if it were the only one.
+
+Respond with ONLY a JSON array, no other text: one {{"id": "<tweet id>", "reply": "<your reply>"}} object per tweet, using the ids exactly as given."""
+
+
+@lru_cache(maxsize=None)
+def batch_system_message(style="Friendly"):
+    """System message for multi-tweet requests: the single-tweet prompt plus the output format"""
+    return SystemMessage(content=f"{system_message(style).content}\n\n{BATCH_INSTRUCTIONS.format()}")
+
+
+def build_batch_messages(tweets, style="Friendly"):
+    payload = json.dumps([{"id": str(tweet["id"]), "text": tweet["content"]} for tweet in tweets],
+                         ensure_ascii=False)
+    return [batch_system_message(style), HumanMessage(content=payload)]
+
+
+def parse_batch_replies(content, tweet_ids):
+    """
+    Pull {tweet_id: reply} out of a batch response
+
+    Entries with an unknown id, a missing or empty reply, or a response that
+    is not a JSON array at all are dropped, so the caller can fall back to
+    single-tweet calls for whatever is missing.
+    """
+    wanted = {str(tweet_id): tweet_id for tweet_id in tweet_ids}
+    text = content.strip()
+    # Models sometimes wrap JSON in a markdown code fence despite being told not to
+    if text.startswith("```"):
+        text = text.strip("`").strip()
+        if text.startswith("json"):
+            text = text[4:]
+    try:
+        items = json.loads(text)
+    except ValueError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    replies = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        tweet_id = wanted.get(str(item.get("id")))
+        reply = item.get("reply")
+        if tweet_id is not None and isinstance(reply, str) and reply.strip():
+            replies[tweet_id] = reply.strip()
+    return replies
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) for sizing requests"""
+    return len(text) // 4 + 1
+
+
+def estimate_request_tokens(tweet_text, style="Friendly", reply_tokens=80):
+    """Rough total tokens (prompt, tweet and reply) of a single-tweet reply request"""
+    return estimate_tokens(system_message(style).content) + estimate_tokens(tweet_text) + reply_tokens
+
+
+class BatchSizer:
+    """
+    Picks how many tweets go into the next batch request
+
+    A batch never exceeds what fits in `context_tokens` after the system
+    prompt and `reply_tokens` of output per tweet. Within that, batches are
+    judged by seconds per tweet against single-tweet calls (the fallback
+    calls, or a one-tweet probe batch when there have been none yet): the
+    size grows by one after a complete batch that beat them, and halves
+    after one that did not, came back partly unparseable or took longer
+    than `target_latency` seconds. Where batching does not pay off, the
+    size settles at one tweet per request.
+    """
+
+    def __init__(self, initial=5, max_size=20, context_tokens=8192, reply_tokens=80, target_latency=30.0):
+        self.size = initial
+        self.max_size = max_size
+        self.context_tokens = context_tokens
+        self.reply_tokens = reply_tokens
+        self.target_latency = target_latency
+        # Moving average of a single-tweet call's latency, the per-tweet path batches have to beat
+        self.single_latency = None
+        self._probing = False
+
+    def take(self, tweets, style="Friendly", workers=1):
+        """
+        Remove and return the next batch from the front of `tweets` (a deque)
+
+        A batch takes at most an even share of the tweets left across
+        `workers` concurrent requests, so none of them sits idle.
+        """
+        size = min(self.size, -(-len(tweets) // workers))
+        if self.single_latency is None and not self._probing:
+            self._probing = True
+            size = 1
+        budget = self.context_tokens - estimate_tokens(batch_system_message(style).content)
+        batch = []
+        while tweets and len(batch) < size:
+            cost = estimate_tokens(tweets[0]["content"]) + 20 + self.reply_tokens
+            if batch and cost > budget:
+                break
+            budget -= cost
+            batch.append(tweets.popleft())
+        return batch
+
+    def observe_single(self, latency):
+        """Record how long a one-tweet request took"""
+        self.single_latency = latency if self.single_latency is None else 0.7 * self.single_latency + 0.3 * latency
+
+    def observe(self, batch_size, latency, parsed):
+        if batch_size == 1:
+            self._probing = False
+            if parsed:
+                self.observe_single(latency)
+        slower = self.single_latency is not None and latency / batch_size > self.single_latency
+        if parsed < batch_size or latency > self.target_latency or slower:
+            self.size = max(1, self.size // 2)
+        elif batch_size >= self.size:
+            self.size = min(self.max_size, self.size + 1)
+
+
+async def generate_replies_batched(tweets, style="Friendly", concurrency=2, timeout=120, llm_client=None,
+                                   cache=None, accounting=None, sizer=None, fallback_concurrency=5):
+    """
+    Like generate_replies, but packs several tweets into each LLM request
+
+    The persona prompt is sent once per batch instead of once per tweet, and
+    the model answers with a JSON array of replies keyed by tweet id. Tweets
+    whose reply is missing or malformed in the batch response (or whose batch
+    failed outright) get a regular single-tweet call, up to
+    `fallback_concurrency` of them at once. Batch sizes come from `sizer`
+    (a BatchSizer), which adapts them to the context window and to the
+    time per tweet compared with single-tweet calls. Yields (tweet_id,
+    reply) pairs as they are ready; every tweet gets exactly one, with None
+    when its reply could not be made.
+    """
+    client = llm_client or get_llm()
+    sizer = sizer or BatchSizer()
+    fallback = asyncio.Semaphore(fallback_concurrency)
+    results = asyncio.Queue()
+    pending = deque()
+    answered = set()
+
+    def emit(tweet_id, reply):
+        answered.add(tweet_id)
+        results.put_nowait((tweet_id, reply))
+
+    for tweet in tweets:
+        cached = cache.get(tweet["content"], style, PROMPT_VERSION) if cache is not None else None
+        if cached is not None:
+            emit(tweet["id"], cached)
+        else:
+            pending.append(tweet)
+
+    async def generate_one(tweet):
+        async with fallback:
+            start = time.perf_counter()
+            reply = await _generate_one(client, tweet, style, timeout, cache, accounting)
+            if reply is not None:
+                sizer.observe_single(time.perf_counter() - start)
+            return reply
+
+    async def run_batch(batch):
+        start = time.perf_counter()
+        try:
+            message = await asyncio.wait_for(client.ainvoke(build_batch_messages(batch, style)), timeout)
+            _record(message, time.perf_counter() - start, accounting, stage="generate_batch")
+            replies = parse_batch_replies(message.content, [tweet["id"] for tweet in batch])
+        except asyncio.TimeoutError:
+            print(f"Timed out generating replies for a batch of {len(batch)} tweets")
+            replies = {}
+        except Exception as e:
+            print(f"Error generating replies for a batch of {len(batch)} tweets: {e}")
+            replies = {}
+        sizer.observe(len(batch), time.perf_counter() - start, len(replies))
+
+        missing = []
+        for tweet in batch:
+            reply = replies.get(tweet["id"])
+            if reply is None:
+                missing.append(tweet)
+                continue
+            emit(tweet["id"], reply)
+            if cache is not None:
+                cache.put(tweet["content"], style, PROMPT_VERSION, reply)
+        for tweet, reply in zip(missing, await asyncio.gather(*(generate_one(tweet) for tweet in missing))):
+            emit(tweet["id"], reply)
+
+    async def worker():
+        while pending:
+            batch = sizer.take(pending, style, workers=concurrency)
+            try:
+                await run_batch(batch)
+            except Exception as e:
+                # Whatever broke (the cache, the sizer), the consumer is still waiting on these tweets
+                print(f"Error finishing a batch of {len(batch)} tweets: {e}")
+                for tweet in batch:
+                    if tweet["id"] not in answered:
+                        emit(tweet["id"], None)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        for _ in range(len(tweets)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
@@ -0,0 +1,213 @@
+import functools
+import inspect
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets, from filter checks (~10us) up to slow LLM calls
+BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_HELP = {
+    "stage_seconds": "Time spent in each pipeline stage",
+    "x_api_request_seconds": "X API call duration per endpoint",
+    "rate_limit_hits_total": "429 responses per endpoint",
+    "reply_cache_requests_total": "Reply cache lookups by result",
+    "llm_tokens_total": "LLM tokens by kind (input, cached, output)",
+    "filter_drops_total": "Tweets dropped by HumanTweetFilter by reason",
+    "tweets_fetched_total": "Tweets returned by the X API",
+    "posts_total": "Reply posting outcomes",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count", "_lock")
+
+    def __init__(self, lock: threading.Lock):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = lock
+
+    def observe(self, value: float):
+        bucket = bisect_left(BUCKETS, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Bucket upper bound below which a fraction q of observations fall"""
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return 0.0
+
+
+class Registry:
+    """
+    Process-wide counters and latency histograms
+
+    Updates are a dict lookup and a few additions under one lock, cheap
+    enough to leave on in the hot path. render() produces the Prometheus
+    text exposition format and snapshot() a plain dict for dashboards.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        """The histogram for one label set, created on first use; hold on to it to skip the lookup"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self._lock)
+            return histogram
+
+    def observe(self, name: str, value: float, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def render(self) -> str:
+        def fmt(labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{fmt(labels)} {value:g}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    bounds = [f"{bound:g}" for bound in BUCKETS] + ["+Inf"]
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{fmt(labels, (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{fmt(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{fmt(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and per-series count/mean/p50/p99 of every histogram"""
+        with self._lock:
+            return {
+                "counters": {name: [{"labels": dict(labels), "value": value} for labels, value in series.items()]
+                             for name, series in self.counters.items()},
+                "histograms": {name: [{"labels": dict(labels), "count": h.count,
+                                       "mean": h.sum / h.count if h.count else 0.0,
+                                       "p50": h.quantile(0.5), "p99": h.quantile(0.99)}
+                                      for labels, h in series.items()]
+                               for name, series in self.histograms.items()},
+            }
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block into stage_seconds{stage=...}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe("stage_seconds", time.perf_counter() - start, stage=stage)
+
+
+def timed(stage: str):
+    """Decorator form of span(); works on plain functions and coroutines"""
+    def decorate(fn):
+        histogram = registry.histogram("stage_seconds", stage=stage)
+        clock = time.perf_counter
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = clock()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    histogram.observe(clock() - start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(clock() - start)
+        return wrapper
+    return decorate
+
+
+def record_usage(message):
+    """Count the tokens an LLM response reports in its usage_metadata"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    details = usage.get("input_token_details") or {}
+    inc("llm_tokens_total", usage.get("input_tokens", 0), kind="input")
+    inc("llm_tokens_total", details.get("cache_read", 0), kind="cached")
+    inc("llm_tokens_total", usage.get("output_tokens", 0), kind="output")
+
+
+def serve(port: int = 9108, host: str = "127.0.0.1"):
+    """Serve /metrics (Prometheus text) and /metrics.json (snapshot) on a daemon thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = registry.render().encode("utf-8"), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(registry.snapshot()).encode("utf-8"), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def fetch_snapshot(url: str = "http://127.0.0.1:9108", timeout: float = 2.0) -> Optional[Dict[str, Any]]:
+    """Read another process's snapshot from its /metrics.json, or None if it is not reachable"""
+    import requests
+    try:
+        return requests.get(f"{url}/metrics.json", timeout=timeout).json()
+    except (requests.RequestException, ValueError):
+        return None
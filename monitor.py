@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import tweepy
+
+import metrics
+from watchlist import MAX_QUERY_LENGTH, KeywordRouter, load_watchlist, pack_queries, split_watches
+from x_api import iter_search_tweets, iter_user_tweets, resolve_user_ids
+from x_clients import get_read_client
+
+
+class TweetMonitor:
+    """
+    Long-running poller for a set of watched keywords and @handles
+
+    Each watch remembers the newest tweet id it has seen (its since_id), so
+    every poll only asks the API for tweets newer than that, paging until
+    all of them are fetched. New tweets are
+    pushed onto `out` for the scoring and reply stages to consume. The
+    since_id of every watch is saved to `state_path` after each poll, so a
+    restarted monitor picks up where the last one stopped.
+
+    With a TweetStore as `store`, every new tweet is also appended there so
+    the history survives across monitoring sessions.
+
+    Watches starting with '@' are handles (get_users_tweets), anything else
+    is a search keyword. Keywords are merged into as few OR-queries as fit in
+    `max_query_length`, handles are resolved to user ids in bulk once and
+    cached, and all queries and timelines are fetched concurrently on
+    `workers` threads. Each queued tweet lists every watch it matched in
+    "watches" ("watch" is the first of them).
+    """
+
+    def __init__(self, watches: List[str], interval: float = 60, max_results: int = 100,
+                 client=None, state_path: Optional[str] = "monitor_state.json",
+                 out: Optional[queue.Queue] = None, store=None, max_query_length: int = MAX_QUERY_LENGTH,
+                 workers: int = 8):
+        self.watches = list(watches)
+        self.interval = interval
+        self.max_results = max_results
+        self.max_query_length = max_query_length
+        self.workers = workers
+        self.client = client or get_read_client()
+        self.state_path = state_path
+        self.out = out if out is not None else queue.Queue()
+        self.store = store
+        self.since_ids: Dict[str, str] = {}
+        self.user_ids: Dict[str, int] = {}
+        # Recently queued ids, so a tweet matching several watches is only queued once
+        self._seen = set()
+        self._seen_order = deque()
+        self._seen_limit = 100_000
+        self._poll_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._load_state()
+
+    def _load_state(self):
+        if self.state_path and os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.since_ids = state.get("since_ids", {})
+            self.user_ids = state.get("user_ids", {})
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"since_ids": self.since_ids, "user_ids": self.user_ids}, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _fetch_limit(self, since_id: Optional[str]) -> Optional[int]:
+        """
+        How many tweets to fetch for a target
+
+        The first poll takes the latest `max_results` tweets. After that
+        every page since the since_id is fetched: the since_id moves to the
+        newest tweet, so any tweet left unfetched would never be seen.
+        """
+        return self.max_results if since_id is None else None
+
+    def _fetch_query(self, query: str, keywords: List[str]) -> List[Dict[str, Any]]:
+        """Fetch tweets for one merged OR-query, tagged with the keywords each one matched"""
+        # The group's since_id is the oldest of its keywords', so no keyword skips tweets it has not seen.
+        # A keyword new to the group starts from there; only a group with no since_id at all is capped.
+        since_ids = [int(self.since_ids[keyword]) for keyword in keywords if keyword in self.since_ids]
+        since_id = str(min(since_ids)) if since_ids else None
+        tweets = list(iter_search_tweets(query, total=self._fetch_limit(since_id), since_id=since_id,
+                                         client=self.client))
+        if tweets:
+            newest = str(max(tweet["id"] for tweet in tweets))
+            for keyword in keywords:
+                self.since_ids[keyword] = newest
+        router = KeywordRouter(keywords)
+        for tweet in tweets:
+            # Fall back to the whole group when the match was on something we can't see (e.g. an expanded link)
+            tweet["watches"] = router.match(tweet["content"]) or list(keywords)
+        return tweets
+
+    def _fetch_handle(self, handle: str) -> List[Dict[str, Any]]:
+        watch = "@" + handle
+        since_id = self.since_ids.get(watch)
+        tweets = list(iter_user_tweets(handle, total=self._fetch_limit(since_id), since_id=since_id,
+                                       client=self.client, user_id=self.user_ids[handle.lower()]))
+        if tweets:
+            self.since_ids[watch] = str(max(tweet["id"] for tweet in tweets))
+        for tweet in tweets:
+            tweet["watches"] = [watch]
+        return tweets
+
+    def poll_once(self) -> int:
+        """Poll every watch once, queue new tweets and return how many were queued"""
+        with self._poll_lock, metrics.span("fetch"):
+            return self._poll_watches()
+
+    def _poll_watches(self) -> int:
+        keywords, handles = split_watches(self.watches)
+        try:
+            resolved = resolve_user_ids(handles, self.client, cache=self.user_ids)
+        except Exception as e:
+            print(f"Error looking up handles: {e}")
+            resolved = {}
+        targets = [(query, group) for query, group in pack_queries(keywords, self.max_query_length)]
+        targets += [(handle, None) for handle in handles if handle in resolved]
+
+        def fetch(target):
+            name, group = target
+            try:
+                return self._fetch_query(name, group) if group is not None else self._fetch_handle(name)
+            except tweepy.TooManyRequests:
+                print(f"Rate limit still exceeded while polling {name}, retrying next cycle")
+            except Exception as e:
+                print(f"Error polling {name}: {e}")
+            return []
+
+        # Merge tweets that came back for several targets, keeping every watch they matched
+        merged: Dict[Any, Dict[str, Any]] = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="monitor") as pool:
+            for tweets in pool.map(fetch, targets):
+                for tweet in tweets:
+                    if tweet["id"] in merged:
+                        merged[tweet["id"]]["watches"] += [w for w in tweet["watches"]
+                                                           if w not in merged[tweet["id"]]["watches"]]
+                    else:
+                        merged[tweet["id"]] = tweet
+
+        # The API returns newest first; hand tweets downstream in posting order
+        new_tweets = sorted((tweet for tweet in merged.values() if tweet["id"] not in self._seen),
+                            key=lambda tweet: int(tweet["id"]))
+        for tweet in new_tweets:
+            tweet["watch"] = tweet["watches"][0]
+        if self.store is not None and new_tweets:
+            self.store.append(new_tweets)
+        for tweet in new_tweets:
+            self._remember(tweet["id"])
+            self.out.put(tweet)
+        self._save_state()
+        return len(new_tweets)
+
+    def _remember(self, tweet_id):
+        self._seen.add(tweet_id)
+        self._seen_order.append(tweet_id)
+        if len(self._seen_order) > self._seen_limit:
+            self._seen.discard(self._seen_order.popleft())
+
+    def run(self):
+        """Poll every `interval` seconds until stop() is called (call poll_once first for an immediate fetch)"""
+        started = time.monotonic()
+        while not self._stop.wait(max(0.0, self.interval - (time.monotonic() - started))):
+            started = time.monotonic()
+            queued = self.poll_once()
+            if queued:
+                print(f"Queued {queued} new tweets from {len(self.watches)} watches")
+
+    def start(self):
+        """Run the poll loop on a background daemon thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="tweet-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def drain(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Take up to `limit` queued tweets without blocking"""
+        tweets = []
+        while limit is None or len(tweets) < limit:
+            try:
+                tweets.append(self.out.get_nowait())
+            except queue.Empty:
+                break
+        return tweets
+
+
+if __name__ == "__main__":
+    from dedup import NearDuplicateIndex
+    from test1 import HumanTweetFilter
+
+    parser = argparse.ArgumentParser(description="Poll keywords and @handles for new tweets")
+    parser.add_argument("watches", nargs="*", help="Keywords or @handles to watch")
+    parser.add_argument("-w", "--watchlist", help="File of keywords and @handles, one per line")
+    parser.add_argument("-i", "--interval", type=float, default=60, help="Seconds between polls")
+    parser.add_argument("--state", default="monitor_state.json", help="Where since_ids are persisted")
+    parser.add_argument("--min-human-score", type=float, default=0.3, help="Minimum human score to keep tweet")
+    args = parser.parse_args()
+    if args.watchlist:
+        args.watches += load_watchlist(args.watchlist)
+    if not args.watches:
+        parser.error("give watches on the command line or with --watchlist")
+
+    monitor = TweetMonitor(args.watches, interval=args.interval, state_path=args.state)
+    tweet_filter = HumanTweetFilter()
+    dedup = NearDuplicateIndex()
+    monitor.poll_once()
+    monitor.start()
+    try:
+        while True:
+            tweet = monitor.out.get()
+            kept = tweet_filter.filter_for_replies(dedup.collapse([tweet]), args.min_human_score)
+            if kept:
+                print(f"[{', '.join(tweet['watches'])}] @{tweet['username']} ({kept[0]['human_score']}): {tweet['content']}")
+    except KeyboardInterrupt:
+        monitor.stop()
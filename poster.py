@@ -0,0 +1,309 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Any, Tuple
+
+import requests
+import tweepy
+from urllib3.exceptions import NewConnectionError
+
+import metrics
+from jobs import dead_worker, worker_name
+from rate_limiter import get_scheduler
+from x_clients import get_write_client
+
+# Transient failures; anything else (bad request, forbidden/duplicate, not found) is final
+RETRYABLE = (tweepy.TwitterServerError, tweepy.TooManyRequests, requests.ConnectionError, requests.Timeout)
+
+
+def _not_sent(error: Exception) -> bool:
+    """
+    Whether a failed create_tweet certainly never reached the API
+
+    Only these are retried blindly. After a read timeout, a dropped
+    connection or a 5xx the reply may have been posted anyway.
+    """
+    if isinstance(error, (tweepy.TooManyRequests, requests.ConnectTimeout)):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        reason = getattr(error.args[0], "reason", error.args[0])
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+class PostLedger:
+    """
+    Persistent record of replies we have posted (tweet_id -> reply id)
+
+    A tweet is claimed before its reply is sent, so concurrent workers and
+    repeated button presses never post twice to the same tweet. Claims
+    record their owner (jobs.worker_name()) and time, so ones left by a
+    crashed or stuck process can be told apart from live ones. A reply
+    whose post failed in a way that may still have gone through is kept
+    'unconfirmed' until ReplyPoster.reconcile() finds it or gives up on it.
+    """
+
+    def __init__(self, path: str = "post_ledger.db", claim_timeout: float = 600):
+        self.path = path
+        self.claim_timeout = claim_timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS posts ("
+                " tweet_id TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " reply_id TEXT,"
+                " reply_text TEXT,"
+                " error TEXT,"
+                " updated_at REAL NOT NULL,"
+                " owner TEXT,"
+                " claimed_at REAL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(posts)")}
+            for column, kind in (("owner", "TEXT"), ("claimed_at", "REAL")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE posts ADD COLUMN {column} {kind}")
+        released = self.release_stale()
+        if released:
+            print(f"Released {released} post claims left by a dead or stuck worker")
+
+    def claim(self, tweet_id, reply_text: Optional[str] = None) -> bool:
+        """Mark a tweet as being replied to; False if it is already posted or in flight"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT status FROM posts WHERE tweet_id = ?", (str(tweet_id),)).fetchone()
+            if row is not None and row[0] != "failed":
+                return False
+            self._conn.execute(
+                "INSERT OR REPLACE INTO posts (tweet_id, status, reply_text, updated_at, owner, claimed_at)"
+                " VALUES (?, 'pending', ?, ?, ?, ?)",
+                (str(tweet_id), reply_text, now, worker_name(threading.current_thread().name), now),
+            )
+            return True
+
+    def release_stale(self) -> int:
+        """
+        Hand claims of crashed or stuck posts over to reconciliation
+
+        A 'pending' claim is stale when its owner was a process on this host
+        that no longer exists, or when it has not been refreshed with touch()
+        for `claim_timeout` seconds. Claims held by this process are live
+        and never released. A stale claim's reply may have been sent before
+        the crash, so it becomes 'unconfirmed' rather than claimable.
+        Returns how many were released.
+        """
+        own = worker_name("")
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT tweet_id, owner, claimed_at FROM posts WHERE status = 'pending'"
+            ).fetchall()
+            cutoff = time.time() - self.claim_timeout
+            stale = [tweet_id for tweet_id, owner, claimed_at in rows
+                     if not (owner or "").startswith(own) and (dead_worker(owner) or (claimed_at or 0) < cutoff)]
+            self._conn.executemany(
+                "UPDATE posts SET status = 'unconfirmed', error = 'claim released', updated_at = ?"
+                " WHERE tweet_id = ? AND status = 'pending'",
+                [(time.time(), tweet_id) for tweet_id in stale],
+            )
+        return len(stale)
+
+    def touch(self, tweet_id):
+        """Refresh a claim that is still being worked on, so other processes do not take it for stale"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE posts SET claimed_at = ? WHERE tweet_id = ? AND status = 'pending'",
+                               (time.time(), str(tweet_id)))
+
+    def mark_posted(self, tweet_id, reply_id, reply_text: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE posts SET status = 'posted', reply_id = ?, reply_text = ?, error = NULL, updated_at = ?"
+                " WHERE tweet_id = ?",
+                (str(reply_id), reply_text, time.time(), str(tweet_id)),
+            )
+
+    def mark_failed(self, tweet_id, error: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE posts SET status = 'failed', error = ?, updated_at = ? WHERE tweet_id = ?",
+                (error, time.time(), str(tweet_id)),
+            )
+
+    def mark_unconfirmed(self, tweet_id, reply_text: str, error: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE posts SET status = 'unconfirmed', reply_text = ?, error = ?, updated_at = ?"
+                " WHERE tweet_id = ?",
+                (reply_text, error, time.time(), str(tweet_id)),
+            )
+
+    def unconfirmed(self) -> List[Tuple[str, str, float]]:
+        """(tweet_id, reply_text, updated_at) of replies that may or may not have been posted"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT tweet_id, reply_text, updated_at FROM posts WHERE status = 'unconfirmed'"
+            ).fetchall()
+
+    def reply_id(self, tweet_id) -> Optional[str]:
+        """Id of our posted reply to tweet_id, if any"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT reply_id FROM posts WHERE tweet_id = ? AND status = 'posted'", (str(tweet_id),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self._conn.close()
+
+
+class ReplyPoster:
+    """
+    Worker pool that posts replies through the create_tweet rate limit
+
+    Tweets already in the ledger are skipped, and every run reports
+    throughput. Failures where the request never reached the API (connect
+    errors, 429s) are retried with exponential backoff. After a read
+    timeout or a 5xx the reply may have been posted anyway, so instead of
+    posting again the account's recent tweets are searched for it; if it
+    is not there yet the tweet is left 'unconfirmed'. Each post_all() first
+    reconciles those: found replies count as posted, and ones still missing
+    `confirm_after` seconds later are marked failed so they can be retried.
+    """
+
+    def __init__(self, client=None, ledger: Optional[PostLedger] = None, workers: int = 4,
+                 max_retries: int = 3, backoff: float = 1.0, confirm_after: float = 120):
+        self.client = client or get_write_client()
+        self.ledger = ledger or PostLedger()
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.confirm_after = confirm_after
+        self.scheduler = get_scheduler()
+        self._me = None
+
+    def _recent_replies(self) -> Dict[str, str]:
+        """tweet_id -> id of our reply to it, over the account's 100 most recent tweets"""
+        if self._me is None:
+            self._me = str(self.scheduler.call("get_me", self.client.get_me).data.id)
+        response = self.scheduler.call("get_users_tweets", self.client.get_users_tweets, priority=5,
+                                       id=self._me, max_results=100, tweet_fields=["referenced_tweets"],
+                                       user_auth=True)
+        replies = {}
+        for tweet in response.data or []:
+            for ref in tweet.referenced_tweets or []:
+                if ref.type == "replied_to":
+                    replies.setdefault(str(ref.id), str(tweet.id))
+        return replies
+
+    def _confirm(self, tweet_id, text: str, error: Exception, attempt: int) -> Dict[str, Any]:
+        """Settle a post whose outcome is unknown by looking for the reply instead of posting it again"""
+        try:
+            reply_id = self._recent_replies().get(str(tweet_id))
+        except Exception as e:
+            print(f"Could not check for a reply to {tweet_id}: {e}")
+            reply_id = None
+        if reply_id:
+            self.ledger.mark_posted(tweet_id, reply_id, text)
+            return {"tweet_id": tweet_id, "status": "posted", "reply_id": reply_id, "attempts": attempt}
+        self.ledger.mark_unconfirmed(tweet_id, text, str(error))
+        return {"tweet_id": tweet_id, "status": "unconfirmed", "error": str(error), "attempts": attempt}
+
+    def reconcile(self) -> Dict[str, int]:
+        """
+        Look up replies left 'unconfirmed' by earlier runs
+
+        Found ones are marked posted; ones still missing `confirm_after`
+        seconds after their post are marked failed, so the next run retries
+        them. Returns the posted/failed counts.
+        """
+        self.ledger.release_stale()
+        pending = self.ledger.unconfirmed()
+        counts = {"posted": 0, "failed": 0}
+        if not pending:
+            return counts
+        try:
+            replies = self._recent_replies()
+        except Exception as e:
+            print(f"Could not reconcile unconfirmed replies: {e}")
+            return counts
+        now = time.time()
+        for tweet_id, text, updated_at in pending:
+            if tweet_id in replies:
+                self.ledger.mark_posted(tweet_id, replies[tweet_id], text)
+                counts["posted"] += 1
+            elif now - updated_at >= self.confirm_after:
+                self.ledger.mark_failed(tweet_id, "reply not found after an unconfirmed post")
+                counts["failed"] += 1
+        return counts
+
+    def _create_tweet(self, tweet_id, text: str):
+        """
+        create_tweet through the rate limit scheduler
+
+        The call can queue until the endpoint's window resets, so the claim
+        is refreshed every quarter of the ledger's claim_timeout meanwhile.
+        """
+        future = self.scheduler.submit("create_tweet", self.client.create_tweet, priority=5,
+                                       text=text, in_reply_to_tweet_id=tweet_id)
+        while not wait([future], timeout=self.ledger.claim_timeout / 4).done:
+            self.ledger.touch(tweet_id)
+        return future.result()
+
+    def _post(self, tweet_id, text: str) -> Dict[str, Any]:
+        if not self.ledger.claim(tweet_id, text):
+            return {"tweet_id": tweet_id, "status": "skipped", "reply_id": self.ledger.reply_id(tweet_id),
+                    "attempts": 0}
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self._create_tweet(tweet_id, text)
+            except RETRYABLE as e:
+                if not _not_sent(e):
+                    return self._confirm(tweet_id, text, e, attempt)
+                if attempt > self.max_retries:
+                    self.ledger.mark_failed(tweet_id, str(e))
+                    return {"tweet_id": tweet_id, "status": "failed", "error": str(e), "attempts": attempt}
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            except Exception as e:
+                self.ledger.mark_failed(tweet_id, str(e))
+                return {"tweet_id": tweet_id, "status": "failed", "error": str(e), "attempts": attempt}
+            else:
+                reply_id = response.data["id"]
+                self.ledger.mark_posted(tweet_id, reply_id, text)
+                return {"tweet_id": tweet_id, "status": "posted", "reply_id": reply_id, "attempts": attempt}
+
+    def post_all(self, replies: Dict[Any, str]) -> Dict[str, Any]:
+        """
+        Post every reply in `replies` (tweet_id -> text) concurrently
+
+        Returns per-tweet results (with the seconds each took) plus
+        posted/skipped/failed/unconfirmed counts, retries, elapsed seconds
+        and posts per second.
+        """
+        self.reconcile()
+
+        def post_one(item):
+            started = time.perf_counter()
+            result = self._post(*item)
+            result["seconds"] = time.perf_counter() - started
+            metrics.observe("stage_seconds", result["seconds"], stage="post")
+            metrics.inc("posts_total", status=result["status"])
+            return result
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="poster") as pool:
+            results = list(pool.map(post_one, replies.items()))
+        elapsed = time.perf_counter() - start
+
+        counts = {status: sum(1 for r in results if r["status"] == status)
+                  for status in ("posted", "skipped", "failed", "unconfirmed")}
+        return {
+            "results": results,
+            **counts,
+            "retries": sum(max(0, r["attempts"] - 1) for r in results),
+            "seconds": elapsed,
+            "posts_per_sec": counts["posted"] / elapsed if elapsed else 0.0,
+        }
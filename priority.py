@@ -0,0 +1,227 @@
+import calendar
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+# Weight of each term in a tweet's priority; every term is scaled to 0..1
+DEFAULT_WEIGHTS = {"human": 1.0, "engagement": 0.5, "recency": 0.5, "author": 1.0}
+
+
+class HourlyQuota:
+    """
+    Sliding one-hour budget (LLM tokens, posts)
+
+    Spending is recorded with its timestamp and forgotten an hour later.
+    With no limit, every request fits.
+    """
+
+    def __init__(self, limit: Optional[float] = None, window: float = 3600):
+        self.limit = limit
+        self.window = window
+        self._spent: deque = deque()
+        self._total = 0.0
+
+    def _expire(self, now: float):
+        while self._spent and self._spent[0][0] <= now - self.window:
+            self._total -= self._spent.popleft()[1]
+
+    def remaining(self, now: Optional[float] = None) -> float:
+        if self.limit is None:
+            return math.inf
+        self._expire(now or time.time())
+        return max(0.0, self.limit - self._total)
+
+    def spend(self, amount: float, now: Optional[float] = None):
+        """
+        Record `amount` as used; a negative amount hands back an unused reservation
+
+        A refund comes off the spending still in the window, newest first,
+        so it expires together with what it refunds and can never free more
+        than the limit.
+        """
+        now = now or time.time()
+        self._expire(now)
+        if amount >= 0:
+            self._spent.append([now, amount])
+            self._total += amount
+            return
+        refund = -amount
+        for entry in reversed(self._spent):
+            if refund <= 0:
+                break
+            taken = min(entry[1], refund)
+            entry[1] -= taken
+            refund -= taken
+            self._total -= taken
+
+
+def tweet_time(tweet: Dict[str, Any]) -> Optional[float]:
+    """Epoch seconds of a tweet's created_at ("%Y-%m-%d %H:%M:%S" UTC or ISO 8601), if it has one"""
+    created_at = tweet.get("created_at")
+    if not created_at:
+        return None
+    try:
+        return float(calendar.timegm(time.strptime(created_at[:19].replace("T", " "), "%Y-%m-%d %H:%M:%S")))
+    except ValueError:
+        return None
+
+
+class ReplyScheduler:
+    """
+    Decides which tweets get the hourly LLM and posting budget, best first
+
+    A tweet's priority blends four terms, each 0..1, with `weights`:
+      human       its human_score from HumanTweetFilter
+      engagement  likes + 2 * retweets + 3 * replies, log-scaled so 1000 is 1
+      recency     exp(-age / half_life)
+      author      `authors[username]` for accounts worth answering first
+    Priorities are computed when tweets are planned, in a max-heap.
+
+    Every tweet also gets a deadline: `max_age` after it was posted or
+    `max_wait` after it was first planned, whichever comes first. A tweet
+    past its deadline is evicted instead of answered, so replies go out
+    within a bounded delay or not at all. Deadlines only apply when a token
+    or post quota is set: without one nothing is ever held back, so every
+    tweet is answered however old it is.
+
+    plan_generation() and plan_posts() pop tweets in priority order while
+    the token and write quotas have room. Tweets that do not fit are
+    deferred and can be planned again later, until they expire. The
+    scheduler is shared by all jobs in a worker, so quotas and
+    first-planned times carry over between them.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, authors: Optional[Dict[str, float]] = None,
+                 half_life: float = 2 * 3600, max_age: float = 12 * 3600, max_wait: float = 3600,
+                 token_quota: Optional[float] = None, post_quota: Optional[float] = None):
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.authors = {username.lower().lstrip("@"): weight for username, weight in (authors or {}).items()}
+        self.half_life = half_life
+        self.max_age = max_age
+        self.max_wait = max_wait
+        self.expires = token_quota is not None or post_quota is not None
+        self.tokens = HourlyQuota(token_quota)
+        self.posts = HourlyQuota(post_quota)
+        # tweet_id -> (priority, deadline) of tweets planned so far, for ordering their posts
+        self._planned: Dict[str, Tuple[float, float]] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def score(self, tweet: Dict[str, Any], now: Optional[float] = None) -> float:
+        now = now or time.time()
+        engagement = (tweet.get("like_count", 0) + 2 * tweet.get("retweet_count", 0)
+                      + 3 * tweet.get("reply_count", 0))
+        created = tweet_time(tweet)
+        age = max(0.0, now - created) if created is not None else 0.0
+        terms = {
+            "human": tweet.get("human_score", 0.0),
+            "engagement": min(1.0, math.log1p(engagement) / math.log1p(1000)),
+            "recency": math.exp(-age / self.half_life),
+            "author": self.authors.get(str(tweet.get("username", "")).lower(), 0.0),
+        }
+        return sum(self.weights.get(name, 0.0) * value for name, value in terms.items())
+
+    def deadline(self, tweet: Dict[str, Any], now: Optional[float] = None) -> float:
+        now = now or time.time()
+        created = tweet_time(tweet)
+        planned = self._planned.get(str(tweet["id"]))
+        deadline = planned[1] if planned else now + self.max_wait
+        return min(deadline, created + self.max_age) if created is not None else deadline
+
+    def _heap(self, items: List[Tuple[str, float, float, Any]], now: float):
+        """Max-heap of (priority, seq, item), with expired items split off"""
+        # Expired tweets are remembered for another max_wait so replanning them does not restart the clock
+        for tweet_id in [tweet_id for tweet_id, (_, deadline) in self._planned.items()
+                         if deadline <= now - self.max_wait]:
+            del self._planned[tweet_id]
+        heap, expired = [], []
+        for tweet_id, priority, deadline, item in items:
+            if self.expires and deadline <= now:
+                expired.append(item)
+            else:
+                heap.append((-priority, next(self._seq), item))
+        heapq.heapify(heap)
+        return heap, expired
+
+    def plan_generation(self, tweets: List[Dict[str, Any]], cost: Callable[[Dict[str, Any]], float],
+                        now: Optional[float] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]],
+                                                              List[Dict[str, Any]]]:
+        """
+        Split tweets into (to generate now, deferred, expired)
+
+        Tweets to generate come best first and their estimated `cost` in
+        tokens is reserved from the hourly token quota; once they have run,
+        swap the reservation for the tokens actually used with
+        settle_tokens(). A tweet that does not fit is deferred, and cheaper
+        tweets after it may still fit.
+        """
+        now = now or time.time()
+        with self._lock:
+            items = []
+            for tweet in tweets:
+                tweet_id = str(tweet["id"])
+                deadline = self.deadline(tweet, now)
+                priority = self.score(tweet, now)
+                self._planned[tweet_id] = (priority, deadline)
+                items.append((tweet_id, priority, deadline, tweet))
+            heap, expired = self._heap(items, now)
+
+            ready, deferred = [], []
+            remaining = self.tokens.remaining(now)
+            reserved = 0.0
+            while heap:
+                tweet = heapq.heappop(heap)[2]
+                tokens = cost(tweet)
+                if reserved + tokens <= remaining:
+                    reserved += tokens
+                    ready.append(tweet)
+                else:
+                    deferred.append(tweet)
+            self.tokens.spend(reserved, now)
+        return ready, deferred, expired
+
+    def settle_tokens(self, reserved: float, used: float):
+        """Replace tokens reserved by plan_generation() with the number the LLM calls actually used"""
+        with self._lock:
+            self.tokens.spend(used - reserved)
+
+    def plan_posts(self, replies: Dict[Any, str],
+                   now: Optional[float] = None) -> Tuple[Dict[Any, str], List[Any], List[Any]]:
+        """
+        Split replies (tweet_id -> text) into (to post now, deferred ids, expired ids)
+
+        Replies to post keep priority order, best first, and are reserved
+        from the hourly write quota; hand back the ones that were not posted
+        with release_posts(). Tweets never planned for generation rank last
+        and do not expire.
+        """
+        now = now or time.time()
+        with self._lock:
+            items = [(str(tweet_id), *self._planned.get(str(tweet_id), (-math.inf, math.inf)), tweet_id)
+                     for tweet_id in replies]
+            heap, expired = self._heap(items, now)
+            slots = self.posts.remaining(now)
+            ready, deferred = {}, []
+            while heap:
+                tweet_id = heapq.heappop(heap)[2]
+                if len(ready) < slots:
+                    ready[tweet_id] = replies[tweet_id]
+                else:
+                    deferred.append(tweet_id)
+            self.posts.spend(len(ready), now)
+        return ready, deferred, expired
+
+    def release_posts(self, count: int):
+        """Return write quota reserved by plan_posts() for replies that were skipped or failed"""
+        with self._lock:
+            self.posts.spend(-count)
+
+    def forget(self, tweet_ids):
+        """Drop tweets that have been answered"""
+        with self._lock:
+            for tweet_id in tweet_ids:
+                self._planned.pop(str(tweet_id), None)
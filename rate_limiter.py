@@ -0,0 +1,244 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import tweepy
+
+import metrics
+
+# (requests, window seconds) per endpoint, from the X API v2 rate limit table
+DEFAULT_LIMITS: Dict[str, Tuple[int, float]] = {
+    "search_recent_tweets": (450, 15 * 60),
+    "get_user": (300, 15 * 60),
+    "get_users": (300, 15 * 60),
+    "get_users_tweets": (1500, 15 * 60),
+    "get_me": (75, 15 * 60),
+    "create_tweet": (200, 15 * 60),
+}
+
+# (method, route pattern) -> endpoint name, for reading rate limit headers off raw responses
+ROUTES = [
+    ("GET", re.compile(r"^/2/tweets/search/recent$"), "search_recent_tweets"),
+    ("GET", re.compile(r"^/2/users/by/username/[^/]+$"), "get_user"),
+    ("GET", re.compile(r"^/2/users/by$"), "get_users"),
+    ("GET", re.compile(r"^/2/users/me$"), "get_me"),
+    ("GET", re.compile(r"^/2/users/[^/]+/tweets$"), "get_users_tweets"),
+    ("POST", re.compile(r"^/2/tweets$"), "create_tweet"),
+]
+
+
+class TokenBucket:
+    """
+    Request budget for one endpoint
+
+    Tokens refill continuously at limit/window per second until the API tells
+    us otherwise. Once rate limit headers have been seen, the bucket trusts
+    them instead: `remaining` tokens until the reset time, then a full bucket.
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.tokens = float(limit)
+        self.reset_at: Optional[float] = None
+        self._updated = time.time()
+
+    def _refill(self, now: float):
+        if self.reset_at is not None:
+            if now >= self.reset_at:
+                self.tokens = float(self.limit)
+                self.reset_at = None
+        else:
+            self.tokens = min(float(self.limit), self.tokens + (now - self._updated) * self.limit / self.window)
+        self._updated = now
+
+    def available(self, now: Optional[float] = None) -> float:
+        self._refill(now or time.time())
+        return self.tokens
+
+    def take(self, now: Optional[float] = None) -> bool:
+        if self.available(now) >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now: Optional[float] = None) -> float:
+        """Seconds until the next token is available"""
+        now = now or time.time()
+        if self.available(now) >= 1:
+            return 0.0
+        if self.reset_at is not None:
+            return max(0.0, self.reset_at - now)
+        return (1 - self.tokens) * self.window / self.limit
+
+    def update(self, limit: Optional[int], remaining: Optional[int], reset_at: Optional[float]):
+        """Sync the bucket with x-rate-limit-limit/remaining/reset"""
+        self._refill(time.time())
+        if limit is not None:
+            self.limit = limit
+        if remaining is not None:
+            self.tokens = float(remaining)
+        if reset_at is not None:
+            self.reset_at = reset_at
+
+
+class RateLimitScheduler:
+    """
+    Central request scheduler for the X API endpoints
+
+    Calls are submitted with a priority (lower runs first) and queued per
+    endpoint. A dispatcher thread starts the most urgent call whose endpoint
+    still has budget, so an exhausted endpoint never holds up the others and
+    nothing sleeps a fixed 15 minutes: a 429 drains the endpoint's bucket
+    until the reset time the API reported and the call is requeued.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[int, float]]] = None, max_workers: int = 8,
+                 max_retries: int = 3):
+        self.buckets = {name: TokenBucket(*limit) for name, limit in (limits or DEFAULT_LIMITS).items()}
+        self.max_retries = max_retries
+        self._queues: Dict[str, list] = {name: [] for name in self.buckets}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="x-api")
+        self._dispatcher = threading.Thread(target=self._dispatch, name="rate-limit-scheduler", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, endpoint: str, fn, *args, priority: int = 10, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs) against endpoint's budget; returns a Future for its result"""
+        future = Future()
+        self._enqueue(endpoint, priority, (fn, args, kwargs, future, 0))
+        return future
+
+    def call(self, endpoint: str, fn, *args, priority: int = 10, **kwargs):
+        """Run fn through the scheduler and wait for its result"""
+        return self.submit(endpoint, fn, *args, priority=priority, **kwargs).result()
+
+    def _enqueue(self, endpoint: str, priority: int, job):
+        with self._cond:
+            if endpoint not in self.buckets:
+                self.buckets[endpoint] = TokenBucket(*DEFAULT_LIMITS.get(endpoint, (15, 15 * 60)))
+                self._queues[endpoint] = []
+            heapq.heappush(self._queues[endpoint], (priority, next(self._seq), job))
+            self._cond.notify()
+
+    def update(self, endpoint: str, headers):
+        """Feed x-rate-limit-* response headers for an endpoint into its bucket"""
+        def header(name):
+            value = headers.get(name)
+            return int(value) if value is not None else None
+
+        if not any(name in headers for name in ("x-rate-limit-limit", "x-rate-limit-remaining", "x-rate-limit-reset")):
+            return
+        with self._cond:
+            if endpoint in self.buckets:
+                self.buckets[endpoint].update(header("x-rate-limit-limit"), header("x-rate-limit-remaining"),
+                                              header("x-rate-limit-reset"))
+            self._cond.notify()
+
+    def remaining(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """Remaining budget, reset time and queued calls per endpoint"""
+        with self._cond:
+            now = time.time()
+            return {
+                name: {
+                    "remaining": int(bucket.available(now)),
+                    "limit": bucket.limit,
+                    "reset_at": bucket.reset_at,
+                    "queued": len(self._queues[name]),
+                }
+                for name, bucket in self.buckets.items()
+            }
+
+    def _next_job(self):
+        """Pop the most urgent job whose endpoint has budget, or return how long to wait"""
+        now = time.time()
+        best = None
+        wait = None
+        for name, jobs in self._queues.items():
+            if not jobs:
+                continue
+            delay = self.buckets[name].wait_time(now)
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+            elif best is None or jobs[0][:2] < self._queues[best][0][:2]:
+                best = name
+        if best is None:
+            return None, wait
+        self.buckets[best].take(now)
+        priority, _, job = heapq.heappop(self._queues[best])
+        return (best, priority, job), None
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                item, wait = self._next_job()
+                while item is None:
+                    self._cond.wait(wait)
+                    item, wait = self._next_job()
+            self._executor.submit(self._run, *item)
+
+    def _run(self, endpoint: str, priority: int, job):
+        fn, args, kwargs, future, attempt = job
+        if future.cancelled():
+            return
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except tweepy.TooManyRequests as e:
+            metrics.inc("rate_limit_hits_total", endpoint=endpoint)
+            self.update(endpoint, e.response.headers)
+            with self._cond:
+                bucket = self.buckets[endpoint]
+                bucket.tokens = 0.0
+                if bucket.reset_at is None:
+                    bucket.reset_at = e.reset_time or time.time() + bucket.window
+            if attempt < self.max_retries:
+                print(f"Rate limit hit on {endpoint}, requeued until reset")
+                self._enqueue(endpoint, priority, (fn, args, kwargs, future, attempt + 1))
+            else:
+                future.set_exception(e)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            metrics.observe("x_api_request_seconds", time.perf_counter() - start, endpoint=endpoint)
+
+
+class RateLimitedClient(tweepy.Client):
+    """tweepy.Client that reports every response's rate limit headers to a scheduler"""
+
+    def __init__(self, *args, scheduler: Optional[RateLimitScheduler] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.scheduler = scheduler or get_scheduler()
+
+    def request(self, method, route, params=None, json=None, user_auth=False):
+        endpoint = next((name for verb, pattern, name in ROUTES
+                         if verb == method and pattern.match(route)), None)
+        try:
+            response = super().request(method, route, params=params, json=json, user_auth=user_auth)
+        except tweepy.TooManyRequests as e:
+            if endpoint:
+                self.scheduler.update(endpoint, e.response.headers)
+            raise
+        if endpoint:
+            self.scheduler.update(endpoint, response.headers)
+        return response
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RateLimitScheduler:
+    """Process-wide scheduler shared by every X API caller"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RateLimitScheduler()
+        return _scheduler
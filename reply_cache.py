@@ -0,0 +1,116 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict
+
+import metrics
+
+
+class ReplyCache:
+    """
+    Disk-backed cache of generated replies
+
+    Entries are keyed by a hash of the normalized tweet text, the reply style
+    and the prompt template version, so repeated copypasta and Streamlit
+    reruns reuse an earlier reply instead of paying for another LLM call.
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted once the cache holds more than `max_entries`. Eviction runs every
+    `evict_every` puts rather than on each one, so the cache can briefly hold
+    that many entries over the cap; get() never returns an expired reply.
+    """
+
+    def __init__(self, path: str = "reply_cache.db", ttl: float = 7 * 24 * 3600, max_entries: int = 10_000,
+                 evict_every: int = 100):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS replies ("
+                " key TEXT PRIMARY KEY,"
+                " reply TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS replies_last_used ON replies (last_used)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS replies_created_at ON replies (created_at)")
+
+    @staticmethod
+    def make_key(tweet_text: str, style: str, prompt_version: str) -> str:
+        """Hash of whitespace/case-normalized text, style and prompt version"""
+        normalized = " ".join(tweet_text.lower().split())
+        raw = "\x1f".join([prompt_version, style.lower(), normalized])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, tweet_text: str, style: str, prompt_version: str) -> Optional[str]:
+        """Return the cached reply, or None on a miss or an expired entry"""
+        key = self.make_key(tweet_text, style, prompt_version)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT reply, created_at FROM replies WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM replies WHERE key = ?", (key,))
+                self.misses += 1
+                metrics.inc("reply_cache_requests_total", result="miss")
+                return None
+            self._conn.execute("UPDATE replies SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            metrics.inc("reply_cache_requests_total", result="hit")
+            return row[0]
+
+    def has(self, tweet_text: str, style: str, prompt_version: str) -> bool:
+        """Whether get() would hit, without counting a request or touching last_used"""
+        key = self.make_key(tweet_text, style, prompt_version)
+        with self._lock:
+            row = self._conn.execute("SELECT created_at FROM replies WHERE key = ?", (key,)).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl
+
+    def put(self, tweet_text: str, style: str, prompt_version: str, reply: str):
+        """Store a reply; every `evict_every` puts, evict expired and then least recently used entries over the cap"""
+        key = self.make_key(tweet_text, style, prompt_version)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO replies (key, reply, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, reply, now, now),
+            )
+            self._puts += 1
+            if self._puts % self.evict_every:
+                return
+            self._conn.execute("DELETE FROM replies WHERE created_at < ?", (now - self.ttl,))
+            overflow = self._conn.execute("SELECT COUNT(*) FROM replies").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM replies WHERE key IN "
+                    "(SELECT key FROM replies ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM replies")
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for this process plus the current entry count"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM replies").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": size,
+        }
+
+    def close(self):
+        self._conn.close()
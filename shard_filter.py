@@ -0,0 +1,152 @@
+import argparse
+import heapq
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+from test1 import HumanTweetFilter
+from tweet_store import TweetStore
+
+_worker_filter = None
+_SEPARATOR = re.compile(r"[\s,]*")
+
+
+def iter_tweets(path: str, chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """
+    Stream tweets from a JSON array file (like tweets.json), a JSONL file or a TweetStore directory
+
+    The JSON array is decoded element by element from fixed-size chunks,
+    so memory stays bounded by the chunk size rather than the file size.
+    """
+    if os.path.isdir(path):
+        yield from TweetStore(path).scan()
+        return
+
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(chunk_size).lstrip()
+        if not buf.startswith("["):
+            # JSONL: one tweet per line
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        pos = 1
+        eof = False
+        while True:
+            pos = _SEPARATOR.match(buf, pos).end()
+            if buf.startswith("]", pos):
+                return
+            try:
+                tweet, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Element spans the chunk boundary; keep the unread tail and read on
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            yield tweet
+
+
+def _init_worker():
+    global _worker_filter
+    _worker_filter = HumanTweetFilter()
+
+
+def _filter_shard(offset: int, tweets: List[Dict[str, Any]], min_human_score: float,
+                  top_k: Optional[int]) -> Tuple[List[Tuple[float, int, Dict[str, Any]]], int, float, int]:
+    """Filter one shard in a worker; returns (sorted results, tweet count, seconds, pid)"""
+    start = time.perf_counter()
+    for i, tweet in enumerate(tweets):
+        tweet["_index"] = offset + i
+    kept = _worker_filter.filter_for_replies(tweets, min_human_score)
+    if top_k is not None:
+        kept = kept[:top_k]
+    results = [(-tweet["human_score"], tweet.pop("_index"), tweet) for tweet in kept]
+    return results, len(tweets), time.perf_counter() - start, os.getpid()
+
+
+def run(path: str, workers: int = None, shard_size: int = 5000, min_human_score: float = 0.3,
+        top_k: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Dict[int, Dict[str, float]]]:
+    """
+    Filter a tweet dump across a process pool and merge the shards in score order
+
+    Args:
+        path: JSON array or JSONL tweet dump, or a tweet store directory
+        workers: Number of worker processes (defaults to CPU count)
+        shard_size: Tweets per shard handed to a worker
+        min_human_score: Minimum human score to keep tweet (0-1)
+        top_k: Keep only the best k tweets overall
+
+    Returns:
+        (tweets, stats) where tweets are ordered like filter_for_replies over the
+        whole dump and stats maps worker pid to tweets, seconds and tweets/sec
+    """
+    workers = workers or os.cpu_count()
+    shards = []
+    stats: Dict[int, Dict[str, float]] = {}
+    tweets = iter_tweets(path)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = set()
+        offset = 0
+        while True:
+            # Keep a bounded number of shards in flight so the dump is never fully in memory
+            while len(pending) < workers * 2:
+                shard = list(islice(tweets, shard_size))
+                if not shard:
+                    break
+                pending.add(pool.submit(_filter_shard, offset, shard, min_human_score, top_k))
+                offset += len(shard)
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results, count, seconds, pid = future.result()
+                shards.append(results)
+                worker = stats.setdefault(pid, {"tweets": 0, "seconds": 0.0})
+                worker["tweets"] += count
+                worker["seconds"] += seconds
+
+    for worker in stats.values():
+        worker["tweets_per_sec"] = worker["tweets"] / worker["seconds"] if worker["seconds"] else 0.0
+
+    # Each shard is already sorted by (-score, index), so a k-way merge gives the global order
+    merged = (tweet for _, _, tweet in heapq.merge(*shards))
+    if top_k is not None:
+        merged = islice(merged, top_k)
+    return list(merged), stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Filter a large tweet dump for reply-worthy tweets using all cores")
+    parser.add_argument("input", help="JSON array or JSONL tweet dump, or a tweet store directory")
+    parser.add_argument("-o", "--output", default="filtered_tweets.json", help="Where to write the filtered tweets")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--shard-size", type=int, default=5000, help="Tweets per shard")
+    parser.add_argument("--min-human-score", type=float, default=0.3, help="Minimum human score to keep tweet")
+    parser.add_argument("-k", "--top-k", type=int, default=None, help="Keep only the best k tweets")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    filtered, worker_stats = run(args.input, args.workers, args.shard_size, args.min_human_score, args.top_k)
+    elapsed = time.perf_counter() - start
+
+    total = sum(int(w["tweets"]) for w in worker_stats.values())
+    for pid, w in sorted(worker_stats.items()):
+        print(f"worker {pid}: {int(w['tweets'])} tweets in {w['seconds']:.2f}s ({w['tweets_per_sec']:,.0f} tweets/s)")
+    print(f"Processed {total} tweets in {elapsed:.2f}s ({total / elapsed:,.0f} tweets/s overall)")
+    print(f"Found {len(filtered)} tweets suitable for replies")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(filtered, f, indent=2, ensure_ascii=False)
+    print(f"Saved to {args.output}")
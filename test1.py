@@ -1,13 +1,105 @@
 import tweepy
-import os
-import json
-from dotenv import load_dotenv
-import time
 import re
+from functools import lru_cache
 from typing import List, Dict, Any
-from datetime import datetime, timedelta
 
-load_dotenv()
+import metrics
+from tweet_store import get_tweet_store
+from x_api import iter_user_tweets
+
+
+class KeywordMatcher:
+    """Single-pass substring matcher over several keyword categories.
+
+    All keywords are folded into one prefix-factored (trie) regex, so each
+    search reports the longest keyword starting at the next position where
+    any keyword starts. Every shorter keyword that is a prefix of it matches
+    at that position too, and those are filled in from a table built up
+    front. Resuming one character after each match start keeps overlapping
+    hits, so the result is exactly ``keyword in text`` for every keyword,
+    computed in one scan instead of one scan per keyword.
+    """
+
+    _END = ''
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        self.categories = list(categories)
+        # keyword -> {category: number of times it is listed there}
+        self._weights: Dict[str, Dict[str, int]] = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                counts = self._weights.setdefault(keyword, {})
+                counts[category] = counts.get(category, 0) + 1
+
+        vocabulary = sorted(self._weights)
+        self._prefixes = {
+            keyword: [other for other in vocabulary if keyword.startswith(other)]
+            for keyword in vocabulary
+        }
+
+        trie: Dict[str, Any] = {}
+        for keyword in vocabulary:
+            node = trie
+            for ch in keyword:
+                node = node.setdefault(ch, {})
+            node[self._END] = True
+        self._regex = re.compile(self._trie_pattern(trie))
+
+    def _trie_pattern(self, node: Dict[str, Any]) -> str:
+        branches = [re.escape(ch) + self._trie_pattern(child)
+                    for ch, child in sorted(node.items()) if ch != self._END]
+        if not branches:
+            return ''
+        if len(branches) == 1 and self._END not in node:
+            return branches[0]
+        body = f"(?:{'|'.join(branches)})"
+        # Greedy optional: try the longer keyword first, fall back to this one
+        return body + '?' if self._END in node else body
+
+    def matches(self, text: str) -> set:
+        """Return the set of keywords that occur anywhere in text"""
+        found = set()
+        search = self._regex.search
+        match = search(text)
+        while match is not None:
+            found.update(self._prefixes[match.group()])
+            match = search(text, match.start() + 1)
+        return found
+
+    def count(self, text: str) -> Dict[str, int]:
+        """Count distinct keyword hits per category (same as summing ``kw in text``)"""
+        counts = dict.fromkeys(self.categories, 0)
+        for keyword in self.matches(text):
+            for category, weight in self._weights[keyword].items():
+                counts[category] += weight
+        return counts
+
+
+@lru_cache(maxsize=8)
+def _compile_tables(promotional_keywords, human_indicators, reply_worthy_indicators, casual_markers,
+                    promo_patterns, bot_patterns, genuine_patterns) -> Dict[str, Any]:
+    """Build the keyword matcher and precompile every regex the checks use"""
+    return {
+        '_matcher': KeywordMatcher({
+            'promotional': list(promotional_keywords),
+            'human': list(human_indicators),
+            'reply_worthy': list(reply_worthy_indicators),
+            'casual': list(casual_markers),
+        }),
+        # Only "any pattern matched" matters for these, so one alternation each
+        '_promo_regex': re.compile('|'.join(f'(?:{p})' for p in promo_patterns), re.IGNORECASE),
+        '_bot_regex': re.compile('|'.join(f'(?:{p})' for p in bot_patterns), re.IGNORECASE),
+        # Each genuine pattern scores separately, so they stay distinct
+        '_genuine_regexes': [re.compile(p, re.IGNORECASE) for p in genuine_patterns],
+        '_hashtag_regex': re.compile(r'#\w+'),
+        '_emoji_regex': re.compile(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]'),
+        '_caps_regex': re.compile(r'[A-Z]{4,}'),
+        '_mentions_only_regex': re.compile(r'^(@\w+\s*)+$'),
+        '_links_only_regex': re.compile(r'^(https?://\S+\s*)+$'),
+        '_contraction_regex': re.compile(r"\b\w+\'[a-z]+\b"),
+        '_pronoun_regex': re.compile(r'\b(i|my|me|myself|we|us|our)\b'),
+    }
+
 
 class HumanTweetFilter:
     
@@ -91,16 +183,8 @@ class HumanTweetFilter:
             'just tried', 'been using', 'switched to', 'moved from',
             'experience with', 'compared to', 'better than', 'worse than'
         ]
-    
-    def is_promotional(self, tweet_data: Dict[str, Any]) -> bool:
-        """Check if tweet is promotional/spam content"""
-        text = tweet_data['content'].lower()
         
-        promo_score = sum(1 for keyword in self.promotional_keywords if keyword in text)
-        if promo_score >= 2:
-            return True
-        
-        promo_patterns = [
+        self.promo_patterns = [
             r'\b\d+%\s*(off|discount|sale)\b',
             r'\$\d+.*\b(off|discount|sale)\b',
             r'\b(free|save)\s+\$\d+\b',
@@ -109,38 +193,73 @@ class HumanTweetFilter:
             r'\b(link in bio|linktree|linktr\.ee)\b',
         ]
         
-        if any(re.search(pattern, text, re.IGNORECASE) for pattern in promo_patterns):
+        # Casual language markers
+        self.casual_markers = ['tbh', 'ngl', 'imo', 'imho', 'lol', 'omg', 'btw', 'idk']
+        
+        self._compile()
+    
+    def _compile(self):
+        """Attach the keyword matcher and compiled regexes, shared by filters with the same lists"""
+        self.__dict__.update(_compile_tables(
+            tuple(self.promotional_keywords), tuple(self.human_indicators),
+            tuple(self.reply_worthy_indicators), tuple(self.casual_markers),
+            tuple(self.promo_patterns), tuple(self.bot_patterns), tuple(self.genuine_patterns),
+        ))
+    
+    def scan(self, tweet_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Lowercase the tweet once and count keyword hits for every category in one pass"""
+        content = tweet_data['content']
+        text = content.lower()
+        hits = self._matcher.count(text)
+        return {
+            'content': content,
+            'text': text,
+            'stripped': text.strip(),
+            'promotional_hits': hits['promotional'],
+            'human_hits': hits['human'],
+            'reply_worthy_hits': hits['reply_worthy'],
+            'casual_hits': hits['casual'],
+        }
+    
+    def is_promotional(self, tweet_data: Dict[str, Any], features: Dict[str, Any] = None) -> bool:
+        """Check if tweet is promotional/spam content"""
+        features = features or self.scan(tweet_data)
+        text = features['text']
+        
+        if features['promotional_hits'] >= 2:
+            return True
+        
+        if self._promo_regex.search(text):
             return True
         
-        if len(re.findall(r'#\w+', text)) > 4:
+        if len(self._hashtag_regex.findall(text)) > 4:
             return True
         
         # Excessive emojis
-        emoji_count = len(re.findall(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]', text))
-        if emoji_count > 6:
+        if len(self._emoji_regex.findall(text)) > 6:
             return True
         
         # All caps (often spam)
-        if len(re.findall(r'[A-Z]{4,}', tweet_data['content'])) > 2:
+        if len(self._caps_regex.findall(features['content'])) > 2:
             return True
         
         return False
     
-    def is_bot_content(self, tweet_data: Dict[str, Any]) -> bool:
+    def is_bot_content(self, tweet_data: Dict[str, Any], features: Dict[str, Any] = None) -> bool:
         """Check if tweet appears to be automated/bot content"""
-        text = tweet_data['content'].lower().strip()
+        features = features or self.scan(tweet_data)
+        text = features['stripped']
         
         # Check against bot patterns
-        for pattern in self.bot_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                return True
+        if self._bot_regex.search(text):
+            return True
         
         # Very short, generic responses
         if len(text) < 10 and text in ['ok', 'yes', 'no', 'thanks', 'nice', 'cool', 'great']:
             return True
         
         # Just links/mentions (often automated)
-        if re.match(r'^(@\w+\s*)+$', text) or re.match(r'^(https?://\S+\s*)+$', text):
+        if self._mentions_only_regex.match(text) or self._links_only_regex.match(text):
             return True
         
         # Repetitive posting pattern (same user posting very similar content)
@@ -150,22 +269,22 @@ class HumanTweetFilter:
         
         return False
     
-    def calculate_human_score(self, tweet_data: Dict[str, Any]) -> float:
+    def calculate_human_score(self, tweet_data: Dict[str, Any], features: Dict[str, Any] = None) -> float:
         """Calculate how human/genuine the tweet appears (0-1)"""
-        text = tweet_data['content'].lower()
+        features = features or self.scan(tweet_data)
+        text = features['text']
         score = 0.3  # Base score
         
         # Human indicators
-        human_matches = sum(1 for indicator in self.human_indicators if indicator in text)
-        score += human_matches * 0.1
+        score += features['human_hits'] * 0.1
         
         # Genuine patterns
-        pattern_matches = sum(1 for pattern in self.genuine_patterns if re.search(pattern, text, re.IGNORECASE))
+        pattern_matches = sum(1 for regex in self._genuine_regexes if regex.search(text))
         score += pattern_matches * 0.15
         
         # Natural language features
         # Contractions (very human)
-        contractions = len(re.findall(r"\b\w+\'[a-z]+\b", text))
+        contractions = len(self._contraction_regex.findall(text))
         score += min(contractions * 0.1, 0.2)
         
         # Questions (engagement)
@@ -173,16 +292,14 @@ class HumanTweetFilter:
         score += min(question_marks * 0.05, 0.15)
         
         # Casual language markers
-        casual_markers = ['tbh', 'ngl', 'imo', 'imho', 'lol', 'omg', 'btw', 'idk']
-        casual_score = sum(1 for marker in casual_markers if marker in text)
-        score += min(casual_score * 0.08, 0.2)
+        score += min(features['casual_hits'] * 0.08, 0.2)
         
         # Personal pronouns (human touch)
-        personal_pronouns = len(re.findall(r'\b(i|my|me|myself|we|us|our)\b', text))
+        personal_pronouns = len(self._pronoun_regex.findall(text))
         score += min(personal_pronouns * 0.05, 0.15)
         
         # Moderate length (too short often spam, too long often promotional)
-        length = len(tweet_data['content'])
+        length = len(features['content'])
         if 20 <= length <= 200:
             score += 0.1
         elif 200 < length <= 280:
@@ -190,15 +307,15 @@ class HumanTweetFilter:
         
         return min(score, 1.0)
     
-    def is_reply_worthy(self, tweet_data: Dict[str, Any]) -> bool:
+    def is_reply_worthy(self, tweet_data: Dict[str, Any], features: Dict[str, Any] = None) -> bool:
         """Check if tweet is worth replying to"""
-        text = tweet_data['content'].lower()
+        features = features or self.scan(tweet_data)
         
         # Check for reply-worthy indicators
-        reply_worthy_matches = sum(1 for indicator in self.reply_worthy_indicators if indicator in text)
+        reply_worthy_matches = features['reply_worthy_hits']
         
         # Questions are always reply-worthy
-        if '?' in text:
+        if '?' in features['text']:
             return True
         
         # Problems/issues are reply-worthy
@@ -206,11 +323,11 @@ class HumanTweetFilter:
             return True
         
         # Avoid replying to retweets (usually not original content)
-        if tweet_data['content'].startswith('RT @'):
+        if features['content'].startswith('RT @'):
             return False
         
         # Avoid very short tweets (often not conversational)
-        if len(tweet_data['content']) < 15:
+        if len(features['content']) < 15:
             return False
         
         return reply_worthy_matches > 0
@@ -218,41 +335,57 @@ class HumanTweetFilter:
     def filter_for_replies(self, tweets: List[Dict[str, Any]], min_human_score: float = 0.3) -> List[Dict[str, Any]]:
         """Filter tweets for those suitable for human-like replies"""
         filtered_tweets = []
+        drops = {"promotional": 0, "bot": 0, "low_human_score": 0, "not_reply_worthy": 0}
         
-        for tweet in tweets:
-            # Skip promotional content
-            if self.is_promotional(tweet):
-                continue
-            
-            # Skip bot content
-            if self.is_bot_content(tweet):
-                continue
-            
-            # Calculate human score
-            human_score = self.calculate_human_score(tweet)
-            tweet['human_score'] = round(human_score, 2)
-            
-            # Check if reply-worthy
-            tweet['reply_worthy'] = self.is_reply_worthy(tweet)
+        # Timed once per batch: a timer around every check costs more than some of the checks
+        with metrics.span("filter"):
+            for tweet in tweets:
+                # Scan the tweet once and share the features across all checks
+                features = self.scan(tweet)
+                
+                # Skip promotional content
+                if self.is_promotional(tweet, features):
+                    drops["promotional"] += 1
+                    continue
+                
+                # Skip bot content
+                if self.is_bot_content(tweet, features):
+                    drops["bot"] += 1
+                    continue
+                
+                # Calculate human score
+                human_score = self.calculate_human_score(tweet, features)
+                tweet['human_score'] = round(human_score, 2)
+                
+                # Check if reply-worthy
+                tweet['reply_worthy'] = self.is_reply_worthy(tweet, features)
+                
+                # Keep only human-like, reply-worthy tweets
+                if human_score < min_human_score:
+                    drops["low_human_score"] += 1
+                elif not tweet['reply_worthy']:
+                    drops["not_reply_worthy"] += 1
+                else:
+                    filtered_tweets.append(tweet)
             
-            # Keep only human-like, reply-worthy tweets
-            if human_score >= min_human_score and tweet['reply_worthy']:
-                filtered_tweets.append(tweet)
-        
-        # Sort by human score (most human-like first)
-        filtered_tweets.sort(key=lambda x: x['human_score'], reverse=True)
+            # Sort by human score (most human-like first)
+            filtered_tweets.sort(key=lambda x: x['human_score'], reverse=True)
         
+        for reason, count in drops.items():
+            if count:
+                metrics.inc("filter_drops_total", count, reason=reason)
         return filtered_tweets
 
 
-def get_recent_tweets(handle, max_results=10, save_path="tweets.json", filter_for_replies=True, min_human_score=0.3):
+@metrics.timed("fetch")
+def get_recent_tweets(handle, max_results=10, save_path="tweet_store", filter_for_replies=True, min_human_score=0.3):
     """
     Fetch recent tweets from a specific handle with filtering for reply-worthy content
     
     Args:
         handle: Twitter handle (with or without @)
         max_results: Maximum number of tweets to fetch
-        save_path: Path to save tweets JSON file (optional)
+        save_path: Tweet store directory to append tweets to (optional)
         filter_for_replies: Whether to filter for reply-worthy content
         min_human_score: Minimum human score to keep tweet (0-1)
     """
@@ -260,49 +393,17 @@ def get_recent_tweets(handle, max_results=10, save_path="tweets.json", filter_fo
         # Clean handle
         handle = handle.replace('@', '')
         
-        client = tweepy.Client(bearer_token=os.getenv("BEARER_TOKEN"))
-        
-        # Get user info first
-        user = client.get_user(username=handle)
-        if not user.data:
-            print(f"User @{handle} not found.")
-            return []
-        
-        user_id = user.data.id
-        
-        # Get user's tweets
-        tweets = client.get_users_tweets(
-            id=user_id,
-            max_results=max_results,
-            tweet_fields=["created_at", "public_metrics", "context_annotations", "conversation_id"],
-            expansions=["referenced_tweets.id"],
-            exclude=["retweets", "replies"]  # Focus on original content
-        )
-        
-        if not tweets.data:
-            print(f"No tweets found for @{handle}.")
-            return []
-        
-        # Process tweets
         tweet_data_list = []
-        for tweet in tweets.data:
+        for tweet_data in iter_user_tweets(handle, total=max_results):
             # Skip if it's a reply to someone else
-            if tweet.text.startswith('@') and tweet.conversation_id != tweet.id:
+            if tweet_data["content"].startswith('@') and not tweet_data["is_original"]:
                 continue
-                
-            tweet_data = {
-                "id": tweet.id,
-                "created_at": tweet.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                "username": handle,
-                "content": tweet.text,
-                "retweet_count": getattr(tweet, 'public_metrics', {}).get('retweet_count', 0),
-                "like_count": getattr(tweet, 'public_metrics', {}).get('like_count', 0),
-                "reply_count": getattr(tweet, 'public_metrics', {}).get('reply_count', 0),
-                "url": f"https://twitter.com/{handle}/status/{tweet.id}",
-                "is_original": tweet.conversation_id == tweet.id  # True if original tweet
-            }
             tweet_data_list.append(tweet_data)
         
+        if not tweet_data_list:
+            print(f"No tweets found for @{handle}.")
+            return []
+        
         print(f"Fetched {len(tweet_data_list)} tweets from @{handle}")
         
         # Apply filtering for reply-worthy content
@@ -315,11 +416,10 @@ def get_recent_tweets(handle, max_results=10, save_path="tweets.json", filter_fo
             print(f"Filtered out {original_count - filtered_count} promotional/bot/non-reply-worthy tweets")
             print(f"Found {filtered_count} tweets suitable for replies")
         
-        # Save to JSON if path provided
+        # Append to the tweet store if path provided
         if save_path:
-            with open(save_path, "w", encoding="utf-8") as f:
-                json.dump(tweet_data_list, f, indent=2, ensure_ascii=False)
-            print(f"Saved to {save_path}")
+            added = get_tweet_store(save_path).append(tweet_data_list)
+            print(f"Stored {added} new tweets in {save_path}")
         
         return tweet_data_list
         
@@ -330,9 +430,8 @@ def get_recent_tweets(handle, max_results=10, save_path="tweets.json", filter_fo
         print(f"Error: User @{handle} not found.")
         return []
     except tweepy.TooManyRequests:
-        print("Rate limit exceeded. Waiting for 15 minutes...")
-        time.sleep(900)
-        return get_recent_tweets(handle, max_results, save_path, filter_for_replies, min_human_score)
+        print("Rate limit still exceeded after waiting for resets. Try again later.")
+        return []
     except Exception as e:
         print(f"Error fetching tweets: {e}")
         return []
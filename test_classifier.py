@@ -0,0 +1,23 @@
+from classifier import ReplyClassifier, choose_threshold
+
+
+def test_threshold_never_splits_tied_probabilities():
+    # At 0.8 only the first tweet is precise, but gate() would keep all three tied ones
+    probabilities = [0.9, 0.8, 0.8, 0.8, 0.3]
+    labels = [1, 1, 0, 0, 1]
+    threshold = choose_threshold(probabilities, labels, min_precision=0.9)
+    assert threshold == 0.9
+
+
+def test_saved_model_round_trips(tmp_path):
+    model = ReplyClassifier(bits=10, threshold=0.7).fit(["help my wallet broke", "buy now cheap"], [1, 0])
+    path = str(tmp_path / "model.npz")
+    model.save(path)
+    loaded = ReplyClassifier.load(path)
+    assert loaded.threshold == 0.7
+    assert loaded.predict_proba("help my wallet broke") == model.predict_proba("help my wallet broke")
+
+
+def test_no_threshold_when_precision_is_out_of_reach():
+    assert choose_threshold([0.9, 0.5], [0, 0], min_precision=0.5) is None
+    assert choose_threshold([], [], min_precision=0.5) is None
@@ -0,0 +1,18 @@
+from dedup import NearDuplicateIndex
+
+
+def tweet(tweet_id, content):
+    return {"id": tweet_id, "content": content}
+
+
+def test_repeat_delivery_of_a_representative_is_kept():
+    index = NearDuplicateIndex()
+    first = [tweet("1", "my hardware wallet will not sync after the firmware update"),
+             tweet("2", "my hardware wallet will not sync after the firmware update!!")]
+    assert [t["id"] for t in index.collapse(first)] == ["1"]
+
+    # The same tweets polled again, e.g. by a second session
+    again = [tweet("1", first[0]["content"]), tweet("2", first[1]["content"])]
+    kept = index.collapse(again)
+    assert [t["id"] for t in kept] == ["1"]
+    assert kept[0]["cluster_size"] == 2
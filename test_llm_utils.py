@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+from fakes import FakeLLM
+from llm_utils import BatchSizer, generate_replies_batched, stream_replies
+
+
+class BrokenCache:
+    def get(self, *args):
+        return None
+
+    def put(self, *args):
+        raise OSError("disk full")
+
+
+def collect(tweets, **kwargs):
+    async def run():
+        return [event async for event in generate_replies_batched(tweets, **kwargs)]
+
+    return asyncio.run(asyncio.wait_for(run(), 10))
+
+
+def make_tweets(n):
+    return [{"id": str(i), "content": f"my wallet {i} will not sync"} for i in range(n)]
+
+
+def test_every_tweet_gets_a_result_when_caching_fails():
+    results = collect(make_tweets(6), llm_client=FakeLLM(latency=0), cache=BrokenCache(),
+                      sizer=BatchSizer(initial=3))
+    assert sorted(tweet_id for tweet_id, _ in results) == [str(i) for i in range(6)]
+
+
+def test_fallback_calls_run_concurrently():
+    sizer = BatchSizer(initial=5)
+    sizer.observe_single(0.2)
+    start = time.perf_counter()
+    results = collect(make_tweets(5), concurrency=1, llm_client=FakeLLM(latency=0.2, batch_drop=1.0),
+                      sizer=sizer)
+    assert all(reply for _, reply in results)
+    # One batch call plus one round of single-tweet calls, not five in a row
+    assert time.perf_counter() - start < 0.8
+
+
+class DictCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, text, style, version):
+        return self.entries.get((text, style, version))
+
+    def put(self, text, style, version, reply):
+        self.entries[(text, style, version)] = reply
+
+
+def test_empty_streamed_reply_is_a_failure():
+    cache = DictCache()
+
+    async def run():
+        return [event async for event in stream_replies(make_tweets(1), llm_client=FakeLLM(latency=0, reply="  "),
+                                                        cache=cache)]
+
+    assert asyncio.run(run())[-1] == ("0", None, True)
+    assert cache.entries == {}
+
+
+def test_batches_shrink_when_slower_per_tweet_than_single_calls():
+    sizer = BatchSizer(initial=8)
+    sizer.observe_single(1.0)
+    sizer.observe(8, 4.0, 8)
+    assert sizer.size == 9
+    sizer.observe(9, 12.0, 9)
+    assert sizer.size == 4
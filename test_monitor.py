@@ -0,0 +1,48 @@
+from fakes import FakeXClient
+from monitor import TweetMonitor
+
+
+def test_handle_poll_fetches_every_tweet_since_last_poll():
+    client = FakeXClient()
+    for i in range(5):
+        client.post("alice", f"old tweet {i}")
+    monitor = TweetMonitor(["@alice"], max_results=10, client=client, state_path=None)
+    assert monitor.poll_once() == 5
+
+    for i in range(30):
+        client.post("alice", f"new tweet {i}")
+    assert monitor.poll_once() == 30
+    assert monitor.poll_once() == 0
+    assert len({tweet["id"] for tweet in monitor.drain()}) == 35
+
+
+def test_first_handle_poll_is_capped_at_max_results():
+    client = FakeXClient()
+    for i in range(30):
+        client.post("alice", f"tweet {i}")
+    monitor = TweetMonitor(["@alice"], max_results=10, client=client, state_path=None)
+    assert monitor.poll_once() == 10
+
+
+def test_keyword_group_poll_fetches_every_tweet_since_last_poll():
+    client = FakeXClient()
+    client.post("alice", "ledger backup")
+    monitor = TweetMonitor(["ledger", "tangem"], max_results=10, client=client, state_path=None)
+    assert monitor.poll_once() == 1
+
+    for i in range(30):
+        client.post("bob", f"{'ledger' if i % 2 else 'tangem'} question {i}")
+    assert monitor.poll_once() == 30
+    assert monitor.poll_once() == 0
+
+
+def test_keyword_added_to_group_does_not_skip_the_others():
+    client = FakeXClient()
+    client.post("alice", "ledger backup")
+    monitor = TweetMonitor(["ledger"], max_results=10, client=client, state_path=None)
+    monitor.poll_once()
+
+    for i in range(30):
+        client.post("bob", f"ledger question {i}")
+    monitor.watches.append("tangem")
+    assert monitor.poll_once() == 30
@@ -0,0 +1,70 @@
+import time
+
+import tweepy
+
+from fakes import StubXServer
+from poster import PostLedger, ReplyPoster
+from x_clients import make_client
+
+
+def make_poster(server, path, **kwargs):
+    client = make_client(base_url=server.url, bearer_token="stub", consumer_key="stub",
+                         consumer_secret="stub", access_token="stub", access_token_secret="stub")
+    return ReplyPoster(client=client, ledger=PostLedger(str(path)), workers=2, backoff=0, **kwargs)
+
+
+def test_reply_lost_behind_5xx_is_found_not_reposted(tmp_path):
+    with StubXServer(lost_posts=1) as server:
+        poster = make_poster(server, tmp_path / "ledger.db")
+        report = poster.post_all({"101": "nice"})
+        assert report["posted"] == 1
+        assert len(server.posted) == 1
+        assert poster.ledger.reply_id("101") is not None
+
+
+def test_unposted_5xx_is_left_unconfirmed_then_retried(tmp_path):
+    with StubXServer(fail_posts=1) as server:
+        poster = make_poster(server, tmp_path / "ledger.db", confirm_after=0)
+        report = poster.post_all({"101": "nice"})
+        assert report["unconfirmed"] == 1
+        assert server.posted == []
+
+        # The reply is still missing, so reconciling gives up on it and the next run posts it
+        report = poster.post_all({"101": "nice"})
+        assert report["posted"] == 1
+        assert len(server.posted) == 1
+
+
+def test_ledger_only_releases_stale_claims(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    ledger = PostLedger(path)
+    assert ledger.claim("101")
+    ledger._conn.execute("INSERT INTO posts (tweet_id, status, updated_at, owner, claimed_at)"
+                         " VALUES ('102', 'pending', 0, 'elsewhere:1:main', 0)")
+    ledger._conn.commit()
+
+    # A second process opening the ledger leaves the live claim alone and hands the old one to reconciliation
+    other = PostLedger(path)
+    assert not other.claim("101")
+    assert [row[0] for row in other.unconfirmed()] == ["102"]
+
+
+def test_claims_of_this_process_are_never_released(tmp_path):
+    ledger = PostLedger(str(tmp_path / "ledger.db"), claim_timeout=0)
+    assert ledger.claim("101")
+    assert ledger.release_stale() == 0
+    assert ledger.unconfirmed() == []
+
+
+def test_claim_is_refreshed_while_the_post_waits(tmp_path):
+    class SlowClient:
+        def create_tweet(self, text, in_reply_to_tweet_id):
+            time.sleep(0.5)
+            return tweepy.Response({"id": "2000001"}, {}, [], {})
+
+    ledger = PostLedger(str(tmp_path / "ledger.db"), claim_timeout=0.2)
+    poster = ReplyPoster(client=SlowClient(), ledger=ledger, workers=1, backoff=0)
+    started = time.time()
+    report = poster.post_all({"101": "nice"})
+    assert report["posted"] == 1
+    assert ledger._conn.execute("SELECT claimed_at FROM posts").fetchone()[0] > started + 0.3
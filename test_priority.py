@@ -0,0 +1,37 @@
+from priority import ReplyScheduler
+
+
+def test_settled_tokens_replace_the_reservation():
+    scheduler = ReplyScheduler(token_quota=1000)
+    tweets = [{"id": str(i), "content": "wallet help"} for i in range(3)]
+    ready, deferred, _ = scheduler.plan_generation(tweets, cost=lambda tweet: 400)
+    assert len(ready) == 2 and len(deferred) == 1
+    assert scheduler.tokens.remaining() == 200
+
+    scheduler.settle_tokens(800, 300)
+    assert scheduler.tokens.remaining() == 700
+    ready, deferred, _ = scheduler.plan_generation(deferred, cost=lambda tweet: 400)
+    assert len(ready) == 1
+
+
+def test_refund_never_outlives_its_reservation():
+    scheduler = ReplyScheduler(token_quota=1000, post_quota=2)
+    t0 = 1_000_000.0
+    scheduler.tokens.spend(1000, now=t0)
+    scheduler.tokens.spend(-900, now=t0 + 600)
+    assert scheduler.tokens.remaining(now=t0 + 601) == 900
+    # The reservation and its refund leave the window together
+    assert scheduler.tokens.remaining(now=t0 + 3601) == 1000
+
+    scheduler.posts.spend(2, now=t0)
+    scheduler.posts.spend(-2, now=t0 + 600)
+    assert scheduler.posts.remaining(now=t0 + 3601) == 2
+
+
+def test_old_tweets_are_answered_without_a_quota():
+    tweets = [{"id": "1", "content": "wallet help", "created_at": "2024-01-01 00:00:00"}]
+    ready, _, expired = ReplyScheduler().plan_generation(tweets, cost=lambda tweet: 100)
+    assert ready == tweets and expired == []
+
+    ready, _, expired = ReplyScheduler(token_quota=1000).plan_generation(tweets, cost=lambda tweet: 100)
+    assert ready == [] and expired == tweets
@@ -0,0 +1,27 @@
+import multiprocessing
+
+from tweet_store import TweetStore
+
+
+def write(directory, first):
+    store = TweetStore(directory, segment_bytes=4096)
+    for i in range(first, first + 200, 10):
+        store.append({"id": j, "created_at": "2024-01-01 00:00:00", "content": f"tweet {j} " * 5}
+                     for j in range(i, i + 10))
+    store.close()
+
+
+def test_processes_appending_to_one_store_keep_offsets_straight(tmp_path):
+    directory = str(tmp_path / "store")
+    TweetStore(directory).close()
+    processes = [multiprocessing.Process(target=write, args=(directory, first)) for first in (1, 1001, 2001)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    store = TweetStore(directory)
+    assert len(store) == 600
+    for first in (1, 1001, 2001):
+        for tweet_id in range(first, first + 200):
+            assert store.get(tweet_id)["id"] == tweet_id
@@ -0,0 +1,162 @@
+import fcntl
+import glob
+import json
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+
+
+class TweetStore:
+    """
+    Append-only tweet store: JSONL segment files plus a SQLite index
+
+    Each tweet is written once as a line at the end of the active segment
+    and indexed by id and created_at with its (segment, offset, length), so
+    writes cost the same no matter how large the store grows, a tweet id is
+    only ever stored once, and readers seek straight to the lines they need
+    instead of loading everything. Segments roll over at `segment_bytes`.
+
+    Several processes may append to one store: each append holds an
+    exclusive flock on the directory's lock file and starts from the real
+    end of the newest segment, so offsets never point into another
+    process's lines.
+    """
+
+    def __init__(self, directory: str = "tweet_store", segment_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        with self._index:
+            self._index.execute(
+                "CREATE TABLE IF NOT EXISTS tweets ("
+                " id INTEGER PRIMARY KEY,"
+                " created_at TEXT,"
+                " segment INTEGER NOT NULL,"
+                " offset INTEGER NOT NULL,"
+                " length INTEGER NOT NULL)"
+            )
+            self._index.execute("CREATE INDEX IF NOT EXISTS tweets_created_at ON tweets (created_at, id)")
+        segments = sorted(glob.glob(os.path.join(directory, "segment-*.jsonl")))
+        self._segment = int(os.path.basename(segments[-1])[8:-6]) if segments else 1
+        self._writer = open(self._segment_path(self._segment), "ab")
+        self._readers: Dict[int, Any] = {}
+        self._append_lock = open(os.path.join(directory, "append.lock"), "ab")
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:06d}.jsonl")
+
+    def _sync_writer(self):
+        """Point the writer at the end of the newest segment, which another process may have started or grown"""
+        segment = self._segment
+        while os.path.exists(self._segment_path(segment + 1)):
+            segment += 1
+        if segment != self._segment:
+            self._writer.close()
+            self._segment = segment
+            self._writer = open(self._segment_path(segment), "ab")
+        self._writer.seek(0, os.SEEK_END)
+
+    def append(self, tweets: Iterable[Dict[str, Any]]) -> int:
+        """Append tweets whose id is not stored yet; returns how many were new"""
+        with self._lock:
+            fcntl.flock(self._append_lock, fcntl.LOCK_EX)
+            try:
+                return self._append(tweets)
+            finally:
+                fcntl.flock(self._append_lock, fcntl.LOCK_UN)
+
+    def _append(self, tweets: Iterable[Dict[str, Any]]) -> int:
+        added = 0
+        with self._index:
+            self._sync_writer()
+            for tweet in tweets:
+                tweet_id = int(tweet["id"])
+                if self._index.execute("SELECT 1 FROM tweets WHERE id = ?", (tweet_id,)).fetchone():
+                    continue
+                if self._writer.tell() >= self.segment_bytes:
+                    self._writer.close()
+                    self._segment += 1
+                    self._writer = open(self._segment_path(self._segment), "ab")
+                line = (json.dumps(tweet, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+                offset = self._writer.tell()
+                self._writer.write(line)
+                self._index.execute(
+                    "INSERT INTO tweets (id, created_at, segment, offset, length) VALUES (?, ?, ?, ?, ?)",
+                    (tweet_id, tweet.get("created_at") or "", self._segment, offset, len(line)),
+                )
+                added += 1
+            # Lines must be on disk before the index rows pointing at them are committed
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+        return added
+
+    def _read(self, segment: int, offset: int, length: int) -> Dict[str, Any]:
+        reader = self._readers.get(segment)
+        if reader is None:
+            reader = self._readers[segment] = open(self._segment_path(segment), "rb")
+        reader.seek(offset)
+        return json.loads(reader.read(length))
+
+    def get(self, tweet_id) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._index.execute(
+                "SELECT segment, offset, length FROM tweets WHERE id = ?", (int(tweet_id),)
+            ).fetchone()
+            return self._read(*row) if row else None
+
+    def __contains__(self, tweet_id) -> bool:
+        with self._lock:
+            return self._index.execute("SELECT 1 FROM tweets WHERE id = ?", (int(tweet_id),)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._index.execute("SELECT COUNT(*) FROM tweets").fetchone()[0]
+
+    def scan(self, start: Optional[str] = None, end: Optional[str] = None,
+             batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Yield tweets with start <= created_at < end in time order
+
+        Bounds use the stored "%Y-%m-%d %H:%M:%S" format; index rows are read
+        in batches so only `batch_size` locations are held in memory at once.
+        """
+        last = (start or "", -1)
+        while True:
+            query = "SELECT created_at, id, segment, offset, length FROM tweets WHERE (created_at, id) > (?, ?)"
+            params: List[Any] = list(last)
+            if end is not None:
+                query += " AND created_at < ?"
+                params.append(end)
+            query += " ORDER BY created_at, id LIMIT ?"
+            params.append(batch_size)
+            with self._lock:
+                rows = self._index.execute(query, params).fetchall()
+                tweets = [self._read(segment, offset, length) for _, _, segment, offset, length in rows]
+            if not rows:
+                return
+            yield from tweets
+            last = rows[-1][:2]
+
+    def close(self):
+        with self._lock:
+            self._writer.close()
+            for reader in self._readers.values():
+                reader.close()
+            self._index.close()
+            self._append_lock.close()
+
+
+_stores: Dict[str, TweetStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_tweet_store(directory: str = "tweet_store") -> TweetStore:
+    """Shared store per directory, so a process keeps one writer per store"""
+    key = os.path.abspath(directory)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = TweetStore(directory)
+        return _stores[key]
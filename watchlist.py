@@ -0,0 +1,99 @@
+import re
+from typing import List, Dict, Iterable, Tuple
+
+# Longest search_recent_tweets query the API accepts (512 on Basic, 4096 on Pro and above)
+MAX_QUERY_LENGTH = 512
+
+_WORD = re.compile(r"[#@$]?\w+")
+
+
+def split_watches(watches: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """Split watch entries into (keywords, handles without '@'), dropping blanks and duplicates"""
+    keywords, handles = [], []
+    for watch in dict.fromkeys(w.strip() for w in watches):
+        if not watch:
+            continue
+        if watch.startswith("@"):
+            handles.append(watch[1:])
+        else:
+            keywords.append(watch)
+    return keywords, handles
+
+
+def load_watchlist(path: str) -> List[str]:
+    """Read watch entries from a file, one per line or comma separated; lines starting with '# ' are comments"""
+    watches = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.lstrip().startswith("# "):
+                continue
+            watches.extend(entry.strip() for entry in line.split(","))
+    return [watch for watch in watches if watch]
+
+
+def query_term(keyword: str) -> str:
+    """Keyword as a search term: phrases are quoted, operators (from:x) and #/$ tags pass through"""
+    if re.fullmatch(r"[#$]?\w+|\w+:\S+", keyword):
+        return keyword
+    return '"' + keyword.replace('"', '') + '"'
+
+
+def pack_queries(keywords: List[str], max_length: int = MAX_QUERY_LENGTH,
+                 suffix: str = "") -> List[Tuple[str, List[str]]]:
+    """
+    Merge keywords into as few OR-queries as fit in `max_length` characters
+
+    Returns (query, keywords it covers) pairs. Keywords are packed longest
+    first into the first query with room left (first-fit decreasing), and
+    `suffix` (e.g. " -is:retweet") is appended to every query.
+    """
+    groups: List[List[str]] = []
+    lengths: List[int] = []
+    # "(" + ")" + suffix
+    overhead = 2 + len(suffix)
+    for keyword in sorted(dict.fromkeys(keywords), key=lambda k: -len(query_term(k))):
+        size = len(query_term(keyword))
+        for i, group in enumerate(groups):
+            if lengths[i] + 4 + size <= max_length:
+                group.append(keyword)
+                lengths[i] += 4 + size
+                break
+        else:
+            groups.append([keyword])
+            lengths.append(overhead + size)
+
+    return [(f"({' OR '.join(query_term(k) for k in group)}){suffix}", group) for group in groups]
+
+
+class KeywordRouter:
+    """
+    Works out which watched keywords a tweet from a merged OR-query matched
+
+    Matching is case-insensitive on whole words, like X search: single words
+    are looked up in the tweet's word set (ignoring #/@/$ unless the keyword
+    has one) and phrases must appear as consecutive words.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.words: Dict[str, List[str]] = {}
+        self.phrases: List[Tuple[str, str]] = []
+        for keyword in keywords:
+            tokens = [t.lower() for t in _WORD.findall(keyword)]
+            if len(tokens) == 1 and ":" not in keyword:
+                self.words.setdefault(tokens[0], []).append(keyword)
+            elif tokens:
+                self.phrases.append((" " + " ".join(t.lstrip("#@$") for t in tokens) + " ", keyword))
+
+    def match(self, text: str) -> List[str]:
+        tokens = [t.lower() for t in _WORD.findall(text)]
+        matched = []
+        seen = set()
+        for token in tokens:
+            for key in (token, token.lstrip("#@$")):
+                if key in self.words and key not in seen:
+                    seen.add(key)
+                    matched.extend(self.words[key])
+        if self.phrases:
+            joined = " " + " ".join(t.lstrip("#@$") for t in tokens) + " "
+            matched.extend(keyword for phrase, keyword in self.phrases if phrase in joined)
+        return matched
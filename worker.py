@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+import traceback
+from typing import Dict, Any, Optional
+
+import metrics
+from classifier import ReplyClassifier
+from dedup import NearDuplicateIndex
+from jobs import JobQueue, worker_name
+from llm_utils import (PROMPT_VERSION, BatchSizer, TokenAccounting, estimate_request_tokens,
+                       generate_replies_batched, stream_replies)
+from monitor import TweetMonitor
+from poster import ReplyPoster
+from priority import ReplyScheduler
+from reply_cache import ReplyCache
+from test1 import HumanTweetFilter
+from tweet_store import get_tweet_store
+
+
+class Worker:
+    """
+    Backend process that runs every network and LLM job for the Streamlit page
+
+    Job kinds:
+      poll      {watches, max_results, since_ids, min_human_score}
+                -> {tweets, since_ids}: new tweets for a list of keywords and
+                @handles, appended to the tweet store, collapsed to one per
+                near-duplicate cluster and filtered for reply-worthiness
+      generate  {tweets, style, mode}
+                -> {replies, skipped, rejected, deferred, expired}: one reply
+                per tweet, best first by the reply scheduler's priority,
+                except tweets whose cluster has since grown into a spam wave
+                ("skipped"), that the local classifier (if any) scores as not
+                worth a reply ("rejected"),
+                that no longer fit this hour's token quota ("deferred") or
+                that are past their deadline ("expired"); while running, the
+                partial result also holds the text generated so far
+                ("partial")
+      post      {replies}
+                -> ReplyPoster.post_all report plus "deferred" and "expired"
+                tweet ids, posting best first within the hourly write quota
+
+    A pool of `threads` threads claims jobs from the shared queue, so many
+    operators and watched queries share the same X API budget, reply cache
+    and post ledger. Run one worker process per ledger.
+    """
+
+    def __init__(self, queue: Optional[JobQueue] = None, threads: int = 4, idle_sleep: float = 0.2,
+                 progress_interval: float = 0.25, scheduler: Optional[ReplyScheduler] = None,
+                 classifier: Optional[ReplyClassifier] = None):
+        self.queue = queue or JobQueue()
+        self.threads = threads
+        self.idle_sleep = idle_sleep
+        self.progress_interval = progress_interval
+        self.cache = ReplyCache()
+        self.tweet_filter = HumanTweetFilter()
+        self.store = get_tweet_store()
+        self.sizer = BatchSizer()
+        self.dedup = NearDuplicateIndex()
+        self.scheduler = scheduler or ReplyScheduler()
+        self.classifier = classifier
+        self.user_ids: Dict[str, int] = {}
+        self._poster = None
+        self._poster_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self.handlers = {"poll": self.poll, "generate": self.generate, "post": self.post}
+
+    @property
+    def poster(self) -> ReplyPoster:
+        # Built on first use so a read-only deployment never needs write credentials
+        with self._poster_lock:
+            if self._poster is None:
+                self._poster = ReplyPoster()
+            return self._poster
+
+    def poll(self, job_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        monitor = TweetMonitor(payload["watches"], max_results=payload.get("max_results", 100), state_path=None,
+                               store=self.store)
+        monitor.user_ids = self.user_ids
+        monitor.since_ids = dict(payload.get("since_ids") or {})
+        monitor.poll_once()
+        tweets = self.dedup.collapse(monitor.drain())
+        tweets = self.tweet_filter.filter_for_replies(tweets, payload.get("min_human_score", 0.3))
+        return {"tweets": tweets, "since_ids": monitor.since_ids}
+
+    def generate(self, job_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        skipped = [tweet["id"] for tweet in payload["tweets"] if self.dedup.is_wave(tweet.get("cluster_id"))]
+        style = payload.get("style", "Friendly")
+        tweets = [tweet for tweet in payload["tweets"] if tweet["id"] not in skipped]
+        rejected = []
+        if self.classifier is not None:
+            tweets, rejected = self.classifier.gate(tweets)
+            rejected = [tweet["id"] for tweet in rejected]
+        costs = {}
+
+        def cost(tweet):
+            # A cached reply needs no LLM call, so it reserves nothing
+            cached = self.cache.has(tweet["content"], style, PROMPT_VERSION)
+            costs[tweet["id"]] = 0 if cached else estimate_request_tokens(tweet["content"], style)
+            return costs[tweet["id"]]
+
+        tweets, deferred, expired = self.scheduler.plan_generation(tweets, cost=cost)
+        reserved = sum(costs[tweet["id"]] for tweet in tweets)
+        deferred = [tweet["id"] for tweet in deferred]
+        expired = [tweet["id"] for tweet in expired]
+        accounting = TokenAccounting()
+
+        async def run():
+            replies, partial = {}, {}
+            published = 0.0
+            if payload.get("mode") == "Batch":
+                events = ((tweet_id, reply, True) async for tweet_id, reply in generate_replies_batched(
+                    tweets, style, concurrency=2, cache=self.cache, accounting=accounting, sizer=self.sizer))
+            else:
+                events = stream_replies(tweets, style, concurrency=8, cache=self.cache, accounting=accounting)
+            async for tweet_id, text, finished in events:
+                if finished:
+                    partial.pop(tweet_id, None)
+                    replies[tweet_id] = text
+                else:
+                    partial[tweet_id] = text
+                now = time.monotonic()
+                if now - published >= self.progress_interval:
+                    self.queue.progress(job_id, {"replies": replies, "partial": partial, "skipped": skipped,
+                                                 "rejected": rejected, "deferred": deferred, "expired": expired})
+                    published = now
+            return {"replies": replies, "skipped": skipped, "rejected": rejected, "deferred": deferred,
+                    "expired": expired}
+
+        try:
+            return asyncio.run(run())
+        finally:
+            # Charge what the LLM calls reported instead of the estimate: cache hits, failures and
+            # batch requests (one prompt for many tweets) all cost less than was reserved
+            usage = accounting.report()
+            self.scheduler.settle_tokens(reserved, usage["input_tokens"] + usage["output_tokens"])
+
+    def post(self, job_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        replies, deferred, expired = self.scheduler.plan_posts(payload["replies"])
+        report = self.poster.post_all(replies)
+        # Unconfirmed replies may have gone out, so their write slots stay spent
+        self.scheduler.release_posts(len(replies) - report["posted"] - report["unconfirmed"])
+        self.scheduler.forget(result["tweet_id"] for result in report["results"] if result["status"] == "posted")
+        return {**report, "deferred": deferred, "expired": expired}
+
+    def _loop(self, name: str):
+        while not self._stop.is_set():
+            job = self.queue.claim(name, list(self.handlers))
+            if job is None:
+                self._stop.wait(self.idle_sleep)
+                continue
+            try:
+                result = self.handlers[job["kind"]](job["id"], job["payload"])
+            except Exception as e:
+                traceback.print_exc()
+                self.queue.fail(job["id"], f"{type(e).__name__}: {e}")
+            else:
+                self.queue.complete(job["id"], result)
+
+    def start(self):
+        released = self.queue.release_orphans()
+        if released:
+            print(f"Requeued {released} jobs left running by a dead worker")
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._loop, args=(worker_name(f"t{i}"),), name=f"worker-{i}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run fetch, generate and post jobs for the Streamlit app")
+    parser.add_argument("-t", "--threads", type=int, default=4, help="Jobs run at the same time")
+    parser.add_argument("--jobs", default="jobs.db", help="Job queue database shared with the app")
+    parser.add_argument("--metrics-port", type=int, default=9108,
+                        help="Port for /metrics (Prometheus) and /metrics.json, 0 to disable")
+    parser.add_argument("--token-quota", type=float, help="LLM tokens to spend per hour (default: unlimited)")
+    parser.add_argument("--post-quota", type=int, help="Replies to post per hour (default: unlimited)")
+    parser.add_argument("--max-age", type=float, default=12 * 3600,
+                        help="Seconds after it was posted that a tweet is still answered, when a quota is set")
+    parser.add_argument("--max-wait", type=float, default=3600,
+                        help="Seconds a tweet may wait for its reply before it is dropped, when a quota is set")
+    parser.add_argument("--weights", type=json.loads,
+                        help='Priority weights as JSON, e.g. \'{"human": 1, "engagement": 0.5, "recency": 0.5}\'')
+    parser.add_argument("--authors", type=json.loads,
+                        help='Priority bonus per author as JSON, e.g. \'{"ledger": 1.0}\'')
+    parser.add_argument("--classifier", help="Local reply classifier (python classifier.py train) to gate "
+                                             "LLM calls with")
+    args = parser.parse_args()
+
+    scheduler = ReplyScheduler(weights=args.weights, authors=args.authors, max_age=args.max_age,
+                               max_wait=args.max_wait, token_quota=args.token_quota, post_quota=args.post_quota)
+    classifier = ReplyClassifier.load(args.classifier) if args.classifier else None
+    worker = Worker(JobQueue(args.jobs), threads=args.threads, scheduler=scheduler, classifier=classifier)
+    worker.start()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+        print(f"Metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+    print(f"Worker running with {args.threads} threads, waiting for jobs in {args.jobs}")
+    try:
+        while True:
+            time.sleep(60)
+            worker.queue.purge()
+    except KeyboardInterrupt:
+        worker.stop(timeout=5)
@@ -1,52 +1,166 @@
 import tweepy
-import os
-import json
-from dotenv import load_dotenv
-import time
+import threading
 
-load_dotenv()
+import metrics
+from rate_limiter import get_scheduler
+from tweet_store import get_tweet_store
+from x_clients import get_read_client
+
+
+def user_map_from(response):
+    """Map author id -> {username, name} from a response's user expansions"""
+    user_map = {}
+    if response.includes and "users" in response.includes:
+        for user in response.includes["users"]:
+            user_map[user.id] = {
+                "username": user.username,
+                "name": user.name
+            }
+    return user_map
+
+
+def tweet_to_dict(tweet, username="unknown", display_name="unknown"):
+    """Normalize a tweepy Tweet into the dict layout the app and filter use"""
+    public_metrics = tweet.public_metrics or {}
+    return {
+        "id": tweet.id,
+        "created_at": tweet.created_at.strftime("%Y-%m-%d %H:%M:%S") if tweet.created_at else None,
+        "username": username,
+        "display_name": display_name,
+        "content": tweet.text,
+        "retweet_count": public_metrics.get("retweet_count", 0),
+        "like_count": public_metrics.get("like_count", 0),
+        "reply_count": public_metrics.get("reply_count", 0),
+        "url": f"https://twitter.com/{username}/status/{tweet.id}"
+    }
+
+
+# handle (lowercase) -> user id, shared by every caller in the process
+_user_ids = {}
+_user_ids_lock = threading.Lock()
+
+
+def resolve_user_ids(handles, client=None, cache=None):
+    """
+    Map handles to user ids, looking up unknown ones 100 at a time with get_users
+
+    Resolved ids are kept in `cache` (a dict, defaults to a process-wide one)
+    so each handle is only ever looked up once. Handles that do not exist are
+    left out of the result.
+    """
+    client = client or get_read_client()
+    cache = _user_ids if cache is None else cache
+    handles = [handle.replace('@', '') for handle in handles]
+    with _user_ids_lock:
+        missing = list(dict.fromkeys(handle for handle in handles if handle.lower() not in cache))
+    for start in range(0, len(missing), 100):
+        batch = missing[start:start + 100]
+        response = get_scheduler().call("get_users", client.get_users, usernames=batch)
+        with _user_ids_lock:
+            for user in response.data or []:
+                cache[user.username.lower()] = user.id
+        for handle in batch:
+            if handle.lower() not in cache:
+                print(f"User @{handle} not found.")
+    with _user_ids_lock:
+        return {handle: cache[handle.lower()] for handle in handles if handle.lower() in cache}
+
+
+def _pages(endpoint, method, total, page_size, min_page_size, token_param, **params):
+    """Call a paginated endpoint through the scheduler until `total` tweets or the last page"""
+    fetched = 0
+    token = None
+    while total is None or fetched < total:
+        size = page_size if total is None else max(min_page_size, min(page_size, total - fetched))
+        if token:
+            params[token_param] = token
+        response = get_scheduler().call(endpoint, method, max_results=size, **params)
+        metrics.inc("tweets_fetched_total", len(response.data or []), endpoint=endpoint)
+        yield response
+        fetched += len(response.data or [])
+        token = (response.meta or {}).get("next_token")
+        if not token:
+            return
+
+
+def iter_search_tweets(query, total=100, start_time=None, since_id=None, page_size=100, client=None):
+    """
+    Page through search_recent_tweets, yielding normalized tweets as each page arrives
+
+    Args:
+        query: Search query
+        total: Stop after this many tweets (None for every page the API returns)
+        start_time: Oldest tweet time to include (datetime or ISO 8601 string)
+        since_id: Only return tweets newer than this id
+        page_size: Tweets per request (10-100)
+        client: tweepy client to use (defaults to the shared read client)
+    """
+    client = client or get_read_client()
+    remaining = total
+    pages = _pages("search_recent_tweets", client.search_recent_tweets, total, page_size, 10, "next_token",
+                   query=query, start_time=start_time, since_id=since_id,
+                   tweet_fields=["created_at", "public_metrics"],
+                   expansions=["author_id"],
+                   user_fields=["username", "name"])
+    for response in pages:
+        user_map = user_map_from(response)
+        for tweet in response.data or []:
+            if remaining is not None and remaining <= 0:
+                return
+            user_info = user_map.get(tweet.author_id, {})
+            yield tweet_to_dict(tweet, user_info.get("username", "unknown"), user_info.get("name", "unknown"))
+            if remaining is not None:
+                remaining -= 1
+
+
+def iter_user_tweets(handle, total=100, start_time=None, since_id=None, page_size=100, client=None,
+                     user_id=None, exclude=("retweets", "replies")):
+    """
+    Page through a handle's timeline with get_users_tweets, yielding normalized tweets per page
+
+    Arguments match iter_search_tweets; pass user_id to skip the user id lookup
+    (otherwise it is resolved once per handle and cached, see resolve_user_ids).
+    Yields nothing if the handle does not exist.
+    """
+    client = client or get_read_client()
+    handle = handle.replace('@', '')
+    if user_id is None:
+        user_id = resolve_user_ids([handle], client).get(handle)
+        if user_id is None:
+            return
+
+    remaining = total
+    pages = _pages("get_users_tweets", client.get_users_tweets, total, page_size, 5, "pagination_token",
+                   id=user_id, start_time=start_time, since_id=since_id,
+                   tweet_fields=["created_at", "public_metrics", "conversation_id"],
+                   exclude=list(exclude) if exclude else None)
+    for response in pages:
+        for tweet in response.data or []:
+            if remaining is not None and remaining <= 0:
+                return
+            tweet_data = tweet_to_dict(tweet, handle, handle)
+            tweet_data["is_original"] = tweet.conversation_id == tweet.id
+            yield tweet_data
+            if remaining is not None:
+                remaining -= 1
 
 # For finding recent tweets based on a keyword
 
 
-def get_recent_tweets(keyword,  max_results=20, save_path="tweets.json"):
+@metrics.timed("fetch")
+def get_recent_tweets(keyword,  max_results=20, save_path="tweet_store"):
     try:
-        client = tweepy.Client(bearer_token=os.getenv("BEARER_TOKEN"))
-        tweets = client.search_recent_tweets(query=keyword, max_results=max_results, tweet_fields=["created_at"],
-                                             expansions=["author_id"],
-                                             user_fields=["username", "name"])
-        if not tweets.data:
+        tweet_data_list = list(iter_search_tweets(keyword, total=max_results))
+        if not tweet_data_list:
             print("No tweets found for the given keyword.")
             return []
 
-        user_map = {}
-        if tweets.includes and "users" in tweets.includes:
-            for user in tweets.includes["users"]:
-                user_map[user.id] = {
-                    "username": user.username,
-                    "name": user.name
-                }
-
-        tweet_data_list = []
-        for tweet in tweets.data:
-            user_info = user_map.get(tweet.author_id, {})
-            tweet_data = {
-                "id": tweet.id,
-                "created_at": tweet.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                "username": user_info.get("username", "unknown"),
-                "display_name": user_info.get("name", "unknown"),
-                "content": tweet.text,
-                "url": f"https://twitter.com/{user_info.get('username', 'unknown')}/status/{tweet.id}"
-            }
-            tweet_data_list.append(tweet_data)
-
-        # Save to JSON file
-        with open(save_path, "w", encoding="utf-8") as f:
-            json.dump(tweet_data_list, f, indent=2, ensure_ascii=False)
+        # Append to the tweet store (already-stored ids are skipped)
+        if save_path:
+            get_tweet_store(save_path).append(tweet_data_list)
 
         return tweet_data_list
 
-    except tweepy.TooManyRequests as e:
-        print("Rate limit exceeded. Waiting for 15 minutes...")
-        time.sleep(900)
-        return get_recent_tweets(keyword)
+    except tweepy.TooManyRequests:
+        print("Rate limit still exceeded after waiting for resets. Try again later.")
+        return []
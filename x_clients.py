@@ -0,0 +1,83 @@
+import os
+import threading
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from rate_limiter import RateLimitedClient
+
+load_dotenv()
+
+API_HOST = "https://api.twitter.com"
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    Keep-alive connection pool for the X API host
+
+    Idempotent requests are retried with exponential backoff on connection
+    errors and 5xx responses; POSTs are only retried when the connection
+    could not be made, so a reply is never sent twice. 429s are left to the
+    rate limit scheduler. With `base_url` set, requests are sent there instead
+    of api.twitter.com (local stub servers, proxies).
+    """
+
+    def __init__(self, pool_size: int = 16, retries: int = 3, backoff: float = 0.5,
+                 base_url: Optional[str] = None):
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=["GET", "HEAD", "OPTIONS"],
+            raise_on_status=False,
+        )
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.base_url = urlsplit(base_url) if base_url else None
+
+    def send(self, request, **kwargs):
+        if self.base_url:
+            url = urlsplit(request.url)
+            request.url = urlunsplit((self.base_url.scheme, self.base_url.netloc, url.path, url.query, url.fragment))
+        return super().send(request, **kwargs)
+
+
+def make_client(pool_size: int = 16, retries: int = 3, base_url: Optional[str] = None,
+                **credentials) -> RateLimitedClient:
+    """Build a RateLimitedClient whose session uses a pooled, retrying adapter"""
+    client = RateLimitedClient(**credentials)
+    adapter = PooledAdapter(pool_size=pool_size, retries=retries,
+                            base_url=base_url or os.getenv("X_API_BASE_URL"))
+    client.session.mount(API_HOST, adapter)
+    return client
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_read_client() -> RateLimitedClient:
+    """Shared app-auth (bearer token) client for all read endpoints"""
+    with _clients_lock:
+        if "read" not in _clients:
+            _clients["read"] = make_client(bearer_token=os.getenv("BEARER_TOKEN"))
+        return _clients["read"]
+
+
+def get_write_client() -> RateLimitedClient:
+    """Shared user-context client for posting"""
+    with _clients_lock:
+        if "write" not in _clients:
+            _clients["write"] = make_client(
+                bearer_token=os.getenv("BEARER_TOKEN"),
+                consumer_key=os.getenv("CONSUMER_KEY"),
+                consumer_secret=os.getenv("CONSUMER_SECRET"),
+                access_token=os.getenv("ACCESS_TOKEN"),
+                access_token_secret=os.getenv("ACCESS_TOKEN_SECRET")
+            )
+        return _clients["write"]